@@ -0,0 +1,195 @@
+"""
+End-to-end benchmarks of the scan and graph subcommands.
+
+Runs `srclib-python.py scan` on each test case and `srclib-python.py graph`
+on each unit it finds, several times, and records the wall time, peak RSS and
+output size of both. The results are compared to a baseline file, and the run
+fails if a tracked metric got worse than the baseline by more than its
+threshold. Use --update to record the results as the new baseline.
+
+    python -m bench.run [--repeat N] [--threshold 0.1] [--update] [case ...]
+
+Note that graph installs the requirements of each unit into the current
+Python environment, like it does when run by srclib.
+"""
+
+import argparse
+import glob
+import json
+import os
+import os.path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import List, Dict, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRCLIB_PYTHON = os.path.join(ROOT_DIR, 'srclib-python.py')
+CASES_DIR = os.path.join(ROOT_DIR, 'testdata', 'case')
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, 'bench', 'baseline.json')
+
+# TRACKED_METRICS are the metrics compared to the baseline by default. Output
+# sizes are recorded too, but they change whenever the output does.
+TRACKED_METRICS = ['scan_wall', 'scan_rss', 'graph_wall', 'graph_rss']
+
+class Run:
+    """ Run is the outcome of running a command once. """
+    def __init__(self, wall: float, rss: int, output: bytes) -> None:
+        self.wall = wall # seconds
+        self.rss = rss # peak resident set size in KB, or None if it can't be measured
+        self.output = output
+
+def run_command(args: List[str], cwd: str, stdin: bytes = b'') -> Run:
+    """
+    Run args in cwd, feeding it stdin, and measure its wall time and, where
+    os.wait4 exists (not on Windows), its peak RSS. Raises an exception if
+    the command fails.
+    """
+    rss = None
+    with tempfile.TemporaryFile() as fin, tempfile.TemporaryFile() as fout:
+        fin.write(stdin)
+        fin.seek(0)
+        start = time.perf_counter()
+        p = subprocess.Popen(args, cwd=cwd, stdin=fin, stdout=fout, stderr=subprocess.DEVNULL)
+        if hasattr(os, 'wait4'):
+            # Wait with wait4 rather than p.wait to get the resource usage of
+            # the child alone.
+            _, status, rusage = os.wait4(p.pid, 0)
+            p.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+            rss = rusage.ru_maxrss
+            if sys.platform == 'darwin':
+                # macOS reports bytes rather than KB.
+                rss //= 1024
+        else:
+            p.wait()
+        wall = time.perf_counter() - start
+        if p.returncode != 0:
+            raise Exception('{} failed in {} with status {}'.format(' '.join(args), cwd, p.returncode))
+        fout.seek(0)
+        output = fout.read()
+    return Run(wall, rss, output)
+
+def max_rss(runs: List[Run]) -> int:
+    """ Returns the peak RSS of runs, or None if it wasn't measured. """
+    if any(r.rss is None for r in runs):
+        return None
+    return max((r.rss for r in runs), default=0)
+
+def bench_case(case_dir: str, repeat: int, graph_args: List[str]) -> Dict[str, float]:
+    """
+    Benchmark scan and graph on a case. Times are the median over the runs,
+    and RSS is the maximum. Graph metrics add up (time, size) or take the
+    maximum (RSS) over the units of the case.
+    """
+    cmd = [sys.executable, SRCLIB_PYTHON]
+    scans = [run_command(cmd + ['scan'], case_dir) for _ in range(repeat)]
+    units = json.loads(scans[0].output.decode('utf-8'))
+    graph_walls = [0.0] * repeat
+    graphs = [] # type: List[Run]
+    graph_bytes = 0
+    for unit in units:
+        stdin = json.dumps(unit).encode('utf-8')
+        for i in range(repeat):
+            r = run_command(cmd + ['graph', '--quiet'] + graph_args, case_dir, stdin)
+            graph_walls[i] += r.wall
+            graphs.append(r)
+        graph_bytes += len(r.output)
+    graph_rss = max_rss(graphs)
+    return {
+        'scan_wall': statistics.median(r.wall for r in scans),
+        'scan_rss': max_rss(scans),
+        'scan_bytes': len(scans[0].output),
+        'units': len(units),
+        'graph_wall': statistics.median(graph_walls),
+        'graph_rss': graph_rss,
+        'graph_bytes': graph_bytes,
+    }
+
+def compare(baseline: Dict[str, Dict[str, float]], results: Dict[str, Dict[str, float]],
+            thresholds: Dict[str, float]) -> List[str]:
+    """
+    Compare results to baseline, both maps from case names to metrics.
+    thresholds maps each tracked metric to the largest allowed relative
+    increase. Returns a description of each regression.
+    """
+    regressions = []
+    for case, metrics in sorted(results.items()):
+        base = baseline.get(case)
+        if base is None:
+            continue
+        for metric, threshold in sorted(thresholds.items()):
+            if metrics.get(metric) is None or not base.get(metric):
+                continue
+            change = metrics[metric] / base[metric] - 1
+            if change > threshold:
+                regressions.append('{}: {} regressed by {:.1f}% ({:.3f} -> {:.3f}, threshold {:.1f}%)'.format(
+                    case, metric, 100 * change, base[metric], metrics[metric], 100 * threshold))
+    return regressions
+
+def parse_thresholds(default: float, overrides: List[str]) -> Dict[str, float]:
+    """ Parse the thresholds of the tracked metrics, given overrides of the form metric=threshold. """
+    thresholds = {m: default for m in TRACKED_METRICS}
+    for o in overrides:
+        metric, _, value = o.partition('=')
+        thresholds[metric] = float(value)
+    return thresholds
+
+def find_cases(names: List[str]) -> List[Tuple[str, str]]:
+    """ Returns the (name, directory) of the named cases, or of all checked out cases. """
+    if names:
+        dirs = [n if os.path.isdir(n) else os.path.join(CASES_DIR, n) for n in names]
+    else:
+        # Cases are git submodules; skip those that aren't checked out.
+        dirs = [d for d in sorted(glob.glob(os.path.join(CASES_DIR, '*'))) if os.listdir(d)]
+    return [(os.path.basename(os.path.normpath(d)), d) for d in dirs]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark scan and graph on the test cases.')
+    parser.add_argument('cases', nargs='*', help='case names or directories (default: all cases in testdata/case)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs per command')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline results file')
+    parser.add_argument('--out', default=None, help='write the results to this file')
+    parser.add_argument('--update', action='store_true', help='record the results in the baseline file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='largest allowed relative increase of a tracked metric')
+    parser.add_argument('--metric-threshold', action='append', default=[], metavar='METRIC=THRESHOLD',
+                        help='threshold of a single metric; may be repeated')
+    parser.add_argument('--graph-args', default='', help='extra arguments to pass to graph')
+    args = parser.parse_args()
+
+    cases = find_cases(args.cases)
+    if len(cases) == 0:
+        sys.exit('no test cases found; run `git submodule update --init` first')
+
+    results = {} # type: Dict[str, Dict[str, float]]
+    for name, case_dir in cases:
+        print('benchmarking {}...'.format(name), file=sys.stderr)
+        results[name] = bench_case(case_dir, args.repeat, args.graph_args.split())
+        print(json.dumps({name: results[name]}, sort_keys=True))
+
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except OSError:
+        baseline = {}
+
+    if args.update:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        return
+
+    regressions = compare(baseline, results, parse_thresholds(args.threshold, args.metric_threshold))
+    for r in regressions:
+        print(r, file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+
+from unittest import mock
+
+from bench.run import compare, parse_thresholds, run_command
+
+class TestCompare(unittest.TestCase):
+    """
+    Tests for compare.
+    """
+    def test_regressions(self):
+        """ Check that only tracked metrics that grew past their threshold are reported. """
+        baseline = {'a': {'graph_wall': 10.0, 'graph_rss': 1000, 'graph_bytes': 5}, 'b': {'graph_wall': 1.0}}
+        results = {
+            'a': {'graph_wall': 10.5, 'graph_rss': 1200, 'graph_bytes': 50},
+            'b': {'graph_wall': 0.5},
+            'c': {'graph_wall': 100.0},
+        }
+        regressions = compare(baseline, results, parse_thresholds(0.1, ['graph_wall=0.01']))
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(regressions[0].startswith('a: graph_rss'))
+        self.assertTrue(regressions[1].startswith('a: graph_wall'))
+
+    def test_unmeasured(self):
+        """ Check that metrics that weren't measured, like RSS on Windows, are skipped. """
+        regressions = compare({'a': {'graph_rss': 1000}}, {'a': {'graph_rss': None}}, parse_thresholds(0.1, []))
+        self.assertEqual([], regressions)
+
+class TestRunCommand(unittest.TestCase):
+    """
+    Tests for run_command.
+    """
+    def test_run(self):
+        r = run_command([sys.executable, '-c', 'import sys; sys.stdout.write(sys.stdin.read())'], os.curdir, b'hi')
+        self.assertEqual(b'hi', r.output)
+        with self.assertRaises(Exception):
+            run_command([sys.executable, '-c', 'raise SystemExit(3)'], os.curdir)
+
+    def test_without_wait4(self):
+        """ Check that without os.wait4, as on Windows, commands run but RSS isn't measured. """
+        with mock.patch.object(os, 'wait4', create=True):
+            del os.wait4
+            r = run_command([sys.executable, '-c', 'print(1)'], os.curdir)
+            with self.assertRaises(Exception):
+                run_command([sys.executable, '-c', 'raise SystemExit(3)'], os.curdir)
+        self.assertEqual(b'1', r.output.strip())
+        self.assertIsNone(r.rss)
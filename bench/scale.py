@@ -0,0 +1,94 @@
+"""
+Scaling sweep of scan and graph over synthetic repositories.
+
+For each size in --sizes, generates a repository with that many files (see
+bench.synth for the other knobs) and benchmarks it like bench.run does. It
+prints how time and memory grow between consecutive sizes as an exponent:
+about 1 means linear, 2 quadratic. Growth above --max-exponent is flagged, and
+the run fails if anything was flagged.
+
+    python -m bench.scale --sizes 100,1000,10000 --fanout 5
+
+As graph installs the synthetic projects into the current Python
+environment, the sweep only runs in a virtualenv.
+"""
+
+import argparse
+import json
+import math
+import sys
+import tempfile
+
+from typing import List, Dict, Tuple
+
+from . import synth
+from .run import bench_case
+
+# SCALED_METRICS are the metrics whose growth is reported.
+SCALED_METRICS = ['scan_wall', 'scan_rss', 'graph_wall', 'graph_rss', 'graph_bytes']
+
+def exponent(n1: int, v1: float, n2: int, v2: float) -> float:
+    """ Returns k such that v2/v1 = (n2/n1)^k, or None if it's undefined or a value wasn't measured. """
+    if v1 is None or v2 is None or n1 <= 0 or n2 <= n1 or v1 <= 0 or v2 <= 0:
+        return None
+    return math.log(v2 / v1) / math.log(n2 / n1)
+
+def report(sizes: List[int], results: List[Dict[str, float]], max_exponent: float) -> Tuple[List[str], int]:
+    """
+    Returns the lines of the scaling report, where growth above max_exponent
+    is marked with '!', and the number of marks.
+    """
+    flagged = 0
+    lines = ['{:>8} '.format('files') + ' '.join('{:>16}'.format(m) for m in SCALED_METRICS)]
+    for i, (n, r) in enumerate(zip(sizes, results)):
+        cells = []
+        for m in SCALED_METRICS:
+            if r[m] is None:
+                # E.g., RSS on Windows.
+                cells.append('{:>16}'.format('-'))
+                continue
+            k = exponent(sizes[i-1], results[i-1][m], n, r[m]) if i > 0 else None
+            flag = ' '
+            if k is not None and k > max_exponent:
+                flag = '!'
+                flagged += 1
+            cells.append('{:>9.3g} {:>5}{}'.format(r[m], '' if k is None else '^{:.2f}'.format(k), flag))
+        lines.append('{:>8} '.format(n) + ' '.join(cells))
+    return lines, flagged
+
+def in_virtualenv() -> bool:
+    """ Reports whether this Python runs in a virtualenv or venv. """
+    return getattr(sys, 'real_prefix', sys.base_prefix) != sys.prefix
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measure how scan and graph scale on synthetic repositories.')
+    parser.add_argument('--sizes', default='100,1000,10000', help='comma-separated numbers of files')
+    parser.add_argument('--repeat', type=int, default=1, help='number of runs per command')
+    parser.add_argument('--max-exponent', type=float, default=1.2, help='flag growth faster than n^max-exponent')
+    parser.add_argument('--graph-args', default='', help='extra arguments to pass to graph')
+    parser.add_argument('--out', default=None, help='write the results to this file')
+    synth.add_arguments(parser)
+    args = parser.parse_args()
+    if not in_virtualenv():
+        parser.error('graph would install the synthetic projects into {}; run in a virtualenv'.format(sys.prefix))
+
+    sizes = sorted(int(s) for s in args.sizes.split(','))
+    results = [] # type: List[Dict[str, float]]
+    for n in sizes:
+        args.files = n
+        with tempfile.TemporaryDirectory(prefix='srclib-python-synth-') as repo:
+            synth.generate(repo, synth.options_from_args(args))
+            print('benchmarking {} files...'.format(n), file=sys.stderr)
+            results.append(bench_case(repo, args.repeat, args.graph_args.split()))
+
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump([dict(files=n, **r) for n, r in zip(sizes, results)], f, indent=2, sort_keys=True)
+
+    lines, flagged = report(sizes, results, args.max_exponent)
+    print('\n'.join(lines))
+    if flagged > 0:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Generator of synthetic Python repositories for scaling tests.
+
+The generated repository has --setup-dirs projects, each a directory with a
+setup.py, a requirements.txt and a package. The --files modules are spread
+evenly over the projects and nested --depth packages deep. Every module
+imports --fanout earlier modules of its project and uses what it imports.
+Each project also has a chain of --reexport-chain modules that re-export a
+class from the previous one, which makes every use of that class at the end
+of the chain a goto chain of that length, and --huge-modules modules of
+--huge-lines lines each.
+
+Requirements of a project are the projects before it (up to --requirements
+of them), given as absolute local paths so that installing them needs no
+network and works from any directory.
+
+    python -m bench.synth --files 1000 --depth 3 OUTPUT_DIR
+
+The output only depends on the options, --seed and OUTPUT_DIR.
+"""
+
+import argparse
+import os
+import os.path
+import random
+
+from typing import List
+
+class Options:
+    def __init__(self, files: int = 100, depth: int = 2, fanout: int = 3, reexport_chain: int = 5,
+                 setup_dirs: int = 1, requirements: int = 0, huge_modules: int = 0, huge_lines: int = 10000,
+                 seed: int = 0) -> None:
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.reexport_chain = reexport_chain
+        self.setup_dirs = setup_dirs
+        self.requirements = requirements
+        self.huge_modules = huge_modules
+        self.huge_lines = huge_lines
+        self.seed = seed
+
+def generate(out_dir: str, opts: Options) -> int:
+    """ Generate a repository in out_dir. Returns the number of Python files written. """
+    rnd = random.Random(opts.seed)
+    written = 0
+    for p in range(opts.setup_dirs):
+        files = opts.files // opts.setup_dirs + (1 if p < opts.files % opts.setup_dirs else 0)
+        written += _generate_project(out_dir, p, files, opts, rnd)
+    return written
+
+def _generate_project(out_dir: str, p: int, files: int, opts: Options, rnd: random.Random) -> int:
+    proj_dir = os.path.join(out_dir, 'proj{}'.format(p))
+    pkg = 'synth{}'.format(p)
+    _write(os.path.join(proj_dir, 'setup.py'), [
+        'from setuptools import find_packages, setup',
+        '',
+        "setup(name='{}', version='0.1', packages=find_packages())".format(pkg),
+    ])
+    # pip resolves relative paths in requirements files against its working
+    # directory, not the file's.
+    _write(os.path.join(proj_dir, 'requirements.txt'),
+           [os.path.join(os.path.abspath(out_dir), 'proj{}'.format(r)) for r in range(max(0, p - opts.requirements), p)])
+
+    written = 0
+    # Modules are named by their dotted path. The packages of a project form
+    # a chain pkg.p1.p2... of the requested depth, and modules are spread
+    # round-robin over its levels.
+    packages = [pkg]
+    for d in range(1, opts.depth):
+        packages.append('{}.p{}'.format(packages[-1], d))
+    for package in packages:
+        _write(_module_file(proj_dir, package + '.__init__'), ['"""{} package."""'.format(package)])
+        written += 1
+
+    chain = []
+    for c in range(opts.reexport_chain):
+        name = '{}.reexport{}'.format(pkg, c)
+        if c == 0:
+            lines = ['class Exported(object):', '    def method(self):', '        return 1']
+        else:
+            lines = ['from {} import Exported'.format(chain[-1])]
+        _write(_module_file(proj_dir, name), lines)
+        chain.append(name)
+        written += 1
+
+    for h in range(opts.huge_modules):
+        _write(_module_file(proj_dir, '{}.huge{}'.format(pkg, h)), _huge_module(opts.huge_lines))
+        written += 1
+
+    modules = [] # type: List[str]
+    for i in range(max(0, files - written)):
+        name = '{}.mod{}'.format(packages[i % len(packages)], i)
+        imports = rnd.sample(modules, min(opts.fanout, len(modules)))
+        _write(_module_file(proj_dir, name), _module(i, imports, chain[-1] if chain else None))
+        modules.append(name)
+        written += 1
+    return written
+
+def _module(i: int, imports: List[str], reexport: str) -> List[str]:
+    lines = ['"""Synthetic module {}."""'.format(i), 'import os']
+    for m in imports:
+        lines.append('import {}'.format(m))
+    if reexport is not None:
+        lines.append('from {} import Exported'.format(reexport))
+    lines.extend([
+        '',
+        '',
+        'class Class{}(object):'.format(i),
+        '    """A class."""',
+        '',
+        '    def __init__(self, value):',
+        '        self.value = value',
+        '',
+        '    def method(self, other):',
+        '        """A method."""',
+        '        return os.path.join(str(self.value), str(other))',
+        '',
+        '',
+        'def function{}(x, y=None):'.format(i),
+        '    """A function."""',
+        '    c = Class{}(x)'.format(i),
+        '    result = c.method(y)',
+    ])
+    for m in imports:
+        j = m.rsplit('.mod', 1)[1]
+        lines.append('    result += {}.function{}(x)'.format(m, j))
+        lines.append('    other = {}.Class{}(x).method(y)'.format(m, j))
+    if reexport is not None:
+        lines.append('    result += str(Exported().method())')
+    lines.extend(['    return result', ''])
+    return lines
+
+def _huge_module(n: int) -> List[str]:
+    lines = ['"""A huge module."""', '']
+    i = 0
+    while len(lines) < n:
+        lines.extend([
+            'def f{}(a, b):'.format(i),
+            '    c = a + b',
+            '    return f{}(c, a) if c else c'.format(max(0, i - 1)),
+            '',
+        ])
+        i += 1
+    return lines
+
+def _module_file(proj_dir: str, name: str) -> str:
+    return os.path.join(proj_dir, *name.split('.')) + '.py'
+
+def _write(path: str, lines: List[str]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """ Add the generator options to parser. """
+    d = Options()
+    parser.add_argument('--files', type=int, default=d.files, help='number of Python files')
+    parser.add_argument('--depth', type=int, default=d.depth, help='package nesting depth')
+    parser.add_argument('--fanout', type=int, default=d.fanout, help='imports of other modules per module')
+    parser.add_argument('--reexport-chain', type=int, default=d.reexport_chain, help='length of the re-export chain of each project')
+    parser.add_argument('--setup-dirs', type=int, default=d.setup_dirs, help='number of projects with a setup.py')
+    parser.add_argument('--requirements', type=int, default=d.requirements, help='number of requirements of each project')
+    parser.add_argument('--huge-modules', type=int, default=d.huge_modules, help='number of huge modules per project')
+    parser.add_argument('--huge-lines', type=int, default=d.huge_lines, help='lines per huge module')
+    parser.add_argument('--seed', type=int, default=d.seed, help='random seed')
+
+def options_from_args(args: argparse.Namespace) -> Options:
+    return Options(
+        files=args.files,
+        depth=args.depth,
+        fanout=args.fanout,
+        reexport_chain=args.reexport_chain,
+        setup_dirs=args.setup_dirs,
+        requirements=args.requirements,
+        huge_modules=args.huge_modules,
+        huge_lines=args.huge_lines,
+        seed=args.seed,
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a synthetic Python repository.')
+    parser.add_argument('out_dir', help='directory to generate the repository in')
+    add_arguments(parser)
+    args = parser.parse_args()
+    n = generate(args.out_dir, options_from_args(args))
+    print('generated {} files in {}'.format(n, args.out_dir))
+
+if __name__ == '__main__':
+    main()
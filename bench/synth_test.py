@@ -0,0 +1,24 @@
+import os
+import tempfile
+import unittest
+from bench import synth
+
+class TestGenerate(unittest.TestCase):
+    """
+    Tests for synth.generate.
+    """
+    def test_generate(self):
+        """ Check that the requested number of valid Python files is generated. """
+        opts = synth.Options(files=40, depth=3, fanout=4, reexport_chain=3, setup_dirs=2, requirements=1,
+                             huge_modules=1, huge_lines=50)
+        with tempfile.TemporaryDirectory() as d:
+            self.assertEqual(40, synth.generate(d, opts))
+            files = []
+            for dirpath, _, filenames in os.walk(d):
+                files.extend(os.path.join(dirpath, f) for f in filenames if f.endswith('.py') and f != 'setup.py')
+            self.assertEqual(40, len(files))
+            for f in files:
+                with open(f) as fp:
+                    compile(fp.read(), f, 'exec')
+            with open(os.path.join(d, 'proj1', 'requirements.txt')) as fp:
+                self.assertEqual(os.path.join(os.path.abspath(d), 'proj0') + '\n', fp.read())
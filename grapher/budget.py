@@ -0,0 +1,113 @@
+import signal
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import List
+
+class BudgetExceeded(BaseException):
+    """
+    Raised when a time budget runs out. It derives from BaseException so that
+    the catch-all handlers around Jedi calls don't swallow it.
+    """
+    pass
+
+class Deadline:
+    """ Deadline is a point in time by which a budgeted piece of work must be done. """
+    def __init__(self, seconds: float) -> None:
+        self.at = time.monotonic() + seconds if seconds else None
+        self.fired = False
+
+    def expired(self) -> bool:
+        return self.at is not None and time.monotonic() >= self.at
+
+class Deadlines:
+    """
+    Deadlines enforces nested time budgets.
+
+    Code that checks its deadlines regularly can stop cooperatively, but a
+    single long Jedi call can't. Such calls run in an interruptible() block:
+    on platforms with setitimer, a SIGALRM timer is armed for the nearest
+    deadline while in the block, and the signal handler raises BudgetExceeded
+    in it. Outside of interruptible blocks, the grapher's own bookkeeping is
+    never interrupted. Each deadline raises at most once from the signal
+    handler. Off the main thread, or without setitimer, budgets are only
+    enforced at the cooperative checks.
+    """
+    def __init__(self) -> None:
+        self._stack = [] # type: List[Deadline]
+        self._interruptible = 0
+        self._use_signal = hasattr(signal, 'setitimer') and hasattr(signal, 'pthread_sigmask') and threading.current_thread() is threading.main_thread()
+
+    @contextmanager
+    def limit(self, seconds: float):
+        """ Run the enclosed block with a budget of seconds (none if 0 or None), yielding its Deadline. """
+        d = Deadline(seconds)
+        if d.at is None:
+            yield d
+            return
+        self._stack.append(d)
+        try:
+            yield d
+        finally:
+            self._stack.remove(d)
+
+    @contextmanager
+    def interruptible(self):
+        """ Allow the enclosed block to be interrupted when a deadline passes. """
+        self.check()
+        if not self._use_signal or len(self._stack) == 0:
+            yield
+            return
+        if self._interruptible == 0:
+            previous = signal.signal(signal.SIGALRM, self._on_alarm)
+        self._interruptible += 1
+        self._arm()
+        try:
+            yield
+        finally:
+            # Once the count drops, the handler no longer raises, so an alarm
+            # on the way out can't skip restoring the previous one.
+            self._interruptible -= 1
+            if self._interruptible == 0:
+                self._disarm(previous)
+
+    def check(self) -> None:
+        """ Raise BudgetExceeded if an active deadline has passed. """
+        for d in self._stack:
+            if d.expired():
+                d.fired = True
+                raise BudgetExceeded()
+
+    def _arm(self) -> None:
+        pending = [d.at for d in self._stack if not d.fired]
+        if len(pending) == 0:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            return
+        signal.setitimer(signal.ITIMER_REAL, max(min(pending) - time.monotonic(), 0.001))
+
+    def _disarm(self, previous) -> None:
+        """ Stop the timer and restore the previous SIGALRM handler, dropping an alarm that is pending. """
+        blocked = signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            if signal.SIGALRM in signal.sigpending():
+                signal.sigwait([signal.SIGALRM])
+            signal.signal(signal.SIGALRM, previous)
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
+
+    def _on_alarm(self, signum, frame) -> None:
+        # An alarm that arrives while leaving the last interruptible block
+        # must not raise in the grapher's own code.
+        if self._interruptible == 0:
+            return
+        fired = False
+        for d in self._stack:
+            if not d.fired and d.expired():
+                d.fired = True
+                fired = True
+        # Arm the timer for the next deadline, or again if it went off early.
+        self._arm()
+        if fired:
+            raise BudgetExceeded()
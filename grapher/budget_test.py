@@ -0,0 +1,49 @@
+import signal
+import time
+import unittest
+from grapher.budget import Deadlines, BudgetExceeded
+
+class TestDeadlines(unittest.TestCase):
+    """
+    Tests for Deadlines.
+    """
+    def test_interrupts_long_calls(self):
+        """ Check that a busy loop in an interruptible block is interrupted once its budget runs out. """
+        deadlines = Deadlines()
+        start = time.monotonic()
+        with self.assertRaises(BudgetExceeded):
+            with deadlines.limit(0.05):
+                with deadlines.interruptible():
+                    while time.monotonic() - start < 5:
+                        pass
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_nested(self):
+        """ Check that an inner budget running out leaves the outer one running. """
+        deadlines = Deadlines()
+        with deadlines.limit(5) as outer:
+            with self.assertRaises(BudgetExceeded):
+                with deadlines.limit(0.01):
+                    time.sleep(0.02)
+                    deadlines.check()
+            self.assertFalse(outer.expired())
+            deadlines.check()
+
+    def test_no_budget(self):
+        deadlines = Deadlines()
+        with deadlines.limit(0) as d:
+            with deadlines.interruptible():
+                pass
+        self.assertFalse(d.expired())
+
+    def test_alarm_outside_interruptible(self):
+        """ Check that an alarm that arrives while leaving an interruptible block doesn't raise, and the handler is restored. """
+        deadlines = Deadlines()
+        previous = signal.getsignal(signal.SIGALRM)
+        with deadlines.limit(0.01):
+            with deadlines.interruptible():
+                pass
+            time.sleep(0.02)
+            deadlines._on_alarm(signal.SIGALRM, None)
+            self.assertIs(previous, signal.getsignal(signal.SIGALRM))
+        self.assertEqual((0, 0), signal.getitimer(signal.ITIMER_REAL))
@@ -1,13 +1,15 @@
 import glob # type: ignore (ignore strange redefinition of glob mypy error)
+import logging
+import mmap
 import os
 import os.path
 import re
-import sys
 
 from .structures import *
-from .util import normalize
+from .util import normalize, pool_imap
 
 module_def_pattern = re.compile(r'static struct PyModuleDef ([A-Za-z0-9_]+)module\s')
+_module_def_pattern = re.compile(module_def_pattern.pattern.encode('ascii'))
 
 class Builtin:
     def __init__(
@@ -49,39 +51,89 @@ class Builtin:
         )
 
 def get_c_source_files(diry: str) -> List[str]:
-    return glob.glob(os.path.join(diry, '**', '*.c'), recursive=True) # type: ignore (recursive=True)
+    return sorted(glob.glob(os.path.join(diry, '**', '*.c'), recursive=True)) # type: ignore (recursive=True)
 
-def find_modules(modules_dir) -> List[Builtin]:
-    builtins = [] # type: List[Builtin]
+def find_modules(modules_dir: str, jobs: int = 1, logger: logging.Logger = None) -> List[Builtin]:
+    """
+    Returns the builtin modules defined in the C source files under
+    modules_dir, and the dotted names (e.g., types or exceptions) defined in
+    them. Files are scanned on up to jobs worker processes; the result is in
+    file order regardless. Progress is logged to logger, if any.
+    """
     cfiles = get_c_source_files(modules_dir)
+    if jobs > 1:
+        results = pool_imap(find_modules_in_file, cfiles, jobs)
+    else:
+        results = map(find_modules_in_file, cfiles)
+    builtins = [] # type: List[Builtin]
+    for i, found in enumerate(results, start=1):
+        if logger is not None:
+            logger.debug('scanned {} ({}/{}): {} definitions'.format(cfiles[i - 1], i, len(cfiles), len(found)))
+        builtins.extend(found)
+    if logger is not None:
+        logger.info('found {} builtin definitions in {} C files'.format(len(builtins), len(cfiles)))
+    return builtins
 
-    for i, cfile in enumerate(cfiles):
-        sys.stderr.write('processing file {}: {}/{}\n'.format(cfile, i, len(cfiles)))
-
-        modules = []
-        with open(cfile) as f:
-            text = f.read()
-        matches = module_def_pattern.finditer(text)
-        for match in matches:
-            if match.group(1) == 'xx': # false positives
+def find_modules_in_file(cfile: str) -> List[Builtin]:
+    """
+    Returns the builtin modules defined in cfile, followed by the dotted names
+    under each of them that appear as string literals, module by module.
+    Offsets are in characters, as if the file were read as text.
+    """
+    with open(cfile, 'rb') as f:
+        try:
+            text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # empty file
+            return []
+    with text:
+        offsets = _CharOffsets(text)
+        modules = [] # type: List[Builtin]
+        for match in _module_def_pattern.finditer(text):
+            if match.group(1) == b'xx': # false positives
                 continue
             modules.append(Builtin(
-                path = match.group(1),
-                start = match.start(1),
-                end = match.end(1),
+                path = match.group(1).decode('ascii'),
+                start = offsets[match.start(1)],
+                end = offsets[match.end(1)],
+                filename = cfile,
+            ))
+        if len(modules) == 0:
+            return []
+
+        # Find the names under all the modules in one pass, then list them
+        # by module.
+        names = {m.path: [] for m in modules} # type: Dict[str, List[Builtin]]
+        def_pattern = re.compile(br'"((' + b'|'.join(re.escape(m.path.encode('ascii')) for m in modules) +
+                                 br')(?:\.[A-Za-z0-9_]+)+)"')
+        for match in def_pattern.finditer(text):
+            path = match.group(1).decode('ascii')
+            if path.endswith('.c') or path.endswith('.h') or path == 'xx': # false positives
+                continue
+            names[match.group(2).decode('ascii')].append(Builtin(
+                path = path,
+                start = offsets[match.start(1)],
+                end = offsets[match.end(1)],
                 filename = cfile,
             ))
-        builtins.extend(modules)
-        for module in modules:
-            def_pattern = r'"({}(?:\.[A-Za-z0-9_]+)+)"'.format(module.path)
-            for match in re.compile(def_pattern).finditer(text):
-                path = match.group(1)
-                if path.endswith('.c') or path.endswith('.h') or path == 'xx': # false positives
-                    continue
-                builtins.append(Builtin(
-                    path = path,
-                    start = match.start(1),
-                    end = match.end(1),
-                    filename = cfile,
-                ))
+    builtins = modules[:]
+    for m in modules:
+        builtins.extend(names[m.path])
     return builtins
+
+class _CharOffsets:
+    """
+    _CharOffsets converts byte offsets in UTF-8 text to character offsets.
+    Only the bytes since the last (lower) offset converted are decoded, as
+    offsets are mostly looked up in increasing order.
+    """
+    def __init__(self, text) -> None:
+        self._text = text
+        self._byte = 0
+        self._char = 0
+
+    def __getitem__(self, offset: int) -> int:
+        if offset < self._byte:
+            self._byte, self._char = 0, 0
+        self._char += len(self._text[self._byte:offset].decode('utf-8', 'surrogateescape'))
+        self._byte = offset
+        return self._char
@@ -0,0 +1,48 @@
+import os
+import os.path
+import tempfile
+import unittest
+
+from grapher.builtin import find_modules
+
+class TestFindModules(unittest.TestCase):
+    """
+    Tests for find_modules.
+    """
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.dir = d.name
+
+    def write(self, f, contents):
+        path = os.path.join(self.dir, f)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write(contents)
+        return path
+
+    def test_find_modules(self):
+        text = ('/* \u00e9 */ static struct PyModuleDef _spammodule = {\n'
+                '"_eggs.X", "_spam.Error", "_spam.c", "_spamx.Y"\n'
+                'static struct PyModuleDef _eggsmodule = {\n'
+                'static struct PyModuleDef xxmodule = {\n')
+        a = self.write('b/a.c', text)
+        self.write('b/empty.c', '')
+        z = self.write('z.c', 'static struct PyModuleDef _zmodule = {"_z.a.b"}')
+        # Offsets are in characters, not UTF-8 bytes.
+        def span(s, after=0):
+            start = text.index(s, after)
+            return start, start + len(s)
+        self.assertEqual([
+            ('_spam',) + span('_spam') + (a,),
+            ('_eggs', text.index('_eggsmodule'), text.index('_eggsmodule') + 5, a),
+            ('_spam.Error',) + span('_spam.Error') + (a,),
+            ('_eggs.X',) + span('_eggs.X') + (a,),
+            ('_z', 26, 28, z),
+            ('_z.a.b', 39, 45, z),
+        ], [(b.path, b.start, b.end, b.filename) for b in find_modules(self.dir)])
+
+    def test_jobs(self):
+        for i in range(5):
+            self.write('m{}.c'.format(i), 'static struct PyModuleDef m{0}module = "m{0}.T"'.format(i))
+        self.assertEqual([repr(b) for b in find_modules(self.dir)], [repr(b) for b in find_modules(self.dir, jobs=3)])
@@ -0,0 +1,210 @@
+import glob
+import hashlib
+import json
+import os
+import os.path
+import sys
+
+from functools import lru_cache
+
+import jedi
+import pkg_resources
+
+from .structures import *
+from .pathtrie import PathTrie
+from .fileindex import FileIndex
+from .reqcache import requirements_file_refs
+from .util import atomic_write, normalize
+
+class GraphCache:
+    """
+    GraphCache is a persistent, size-bounded cache of per-file graph results
+    for one unit.
+
+    Entries are keyed on the content hash and path of a file, together with
+    everything else that determines its graph output: the contents of all
+    files of the unit, as a file's refs may resolve into any of them, the
+    unit key and directory, the module path prefix to dependency mapping,
+    the options that change the output (e.g., fast mode, or the search path),
+    the versions of the installed distributions, whose modules refs resolve
+    into, and the Jedi, Python and grapher versions. The grapher version is
+    a hash of the grapher sources, so any change to the grapher invalidates
+    the cache. Entries are thus reused only when a unit is graphed again
+    unchanged, e.g. at another commit that didn't touch it.
+
+    An entry's mtime is its last use; evict() removes least recently used
+    entries until the cache fits in max_size bytes.
+    """
+    def __init__(self, cache_dir: str, max_size: int, u: Unit, prefixToDep: PathTrie, options: Dict[str, Any]) -> None:
+        self._dir = cache_dir
+        self._max_size = max_size
+        # _file_digests maps each file of the unit to the digest of its
+        # contents, or None if it can't be read.
+        self._file_digests = {f: _file_digest(f) for f in u.Files} # type: Dict[str, str]
+        self._unit_digest = _digest(json.dumps([
+            toJSONable(u.key()),
+            u.Dir,
+            sorted(self._file_digests.items()),
+            sorted((prefix, toJSONable(dep)) for prefix, dep in prefixToDep.items()),
+            options,
+            installed_versions(),
+            jedi.__version__,
+            sys.version,
+            grapher_version(),
+        ], sort_keys=True).encode('utf-8'))
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, f: str) -> str:
+        """ Return the cache key of file f, or None if it can't be read. """
+        digest = self._file_digests[f] if f in self._file_digests else _file_digest(f)
+        if digest is None:
+            return None
+        return _digest('\0'.join([self._unit_digest, f, digest]).encode('utf-8'))
+
+    def contains(self, key: str) -> bool:
+        return key is not None and os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """ Return the cached (defs, refs, docs) for key, or None on a miss. """
+        if key is None:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as fp:
+                entry = json.load(fp)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['Defs'], entry['Refs'], entry['Docs']
+
+    def put(self, key: str, result: Tuple[List[Dict], List[Dict], List[Dict]]) -> None:
+        if key is None:
+            return
+        defs, refs, docs = result
+        with atomic_write(self._path(key)) as fp:
+            json.dump({'Defs': defs, 'Refs': refs, 'Docs': docs}, fp)
+
+    def evict(self) -> int:
+        """ Remove least recently used entries until the cache fits. Returns the number removed. """
+        entries = []
+        total = 0
+        for path in glob.glob(os.path.join(self._dir, '*', '*.json')):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        removed = 0
+        for _, size, path in entries:
+            if total <= self._max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._dir, key[:2], key + '.json')
+
+# SCAN_MANIFESTS are the files in a unit directory that determine its setup
+# info and requirements.
+SCAN_MANIFESTS = ['setup.py', 'setup.cfg', 'requirements.txt']
+
+class ScanCache:
+    """
+    ScanCache is a persistent cache of what scan learns from pydep about a
+    directory: its setup info and the unresolved specs of its requirements.
+    Resolved requirements aren't cached here, as they change with new
+    releases and resolution settings; scan resolves the specs through the
+    RequirementCache on each run.
+
+    An entry is valid while the fingerprint of its directory is unchanged.
+    The fingerprint hashes the contents of the directory's manifests
+    (SCAN_MANIFESTS) and of the requirements files they include, the scan
+    settings, the Python and grapher versions and, for entries that
+    depend on the package layout (e.g., setup info, as setup.py may call
+    find_packages), the list of package directories under it. Manifests are
+    hashed rather than compared by mtime, as a fresh checkout has new mtimes.
+    Other files that setup.py reads, e.g. a version module or a README, are
+    not hashed: entries outlive changes to them until the cache is cleared.
+    Directories are identified by their path relative to the root of the
+    index, so the cache can be shared by checkouts in different places.
+    """
+    def __init__(self, cache_dir: str, index: FileIndex, settings: Dict[str, Any] = None) -> None:
+        self._dir = cache_dir
+        self._index = index
+        self._settings = settings
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, diry: str, packages: bool = False) -> Tuple[bool, Any]:
+        """ Returns (found, cached value) of kind for diry. """
+        try:
+            with open(self._path(kind, diry), encoding='utf-8') as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            entry = None
+        if entry is None or entry.get('Fingerprint') != self._fingerprint(diry, packages):
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, entry['Value']
+
+    def put(self, kind: str, diry: str, value: Any, packages: bool = False) -> None:
+        """ Record the JSON-serializable value of kind for diry. """
+        with atomic_write(self._path(kind, diry)) as fp:
+            json.dump({'Fingerprint': self._fingerprint(diry, packages), 'Value': value}, fp)
+
+    def _fingerprint(self, diry: str, packages: bool) -> str:
+        h = hashlib.sha1()
+        h.update(json.dumps([sys.version, grapher_version(), self._settings], sort_keys=True).encode('utf-8'))
+        req_files, _ = requirements_file_refs(os.path.join(diry, 'requirements.txt'))
+        for m in SCAN_MANIFESTS + [os.path.relpath(f, diry) for f in req_files]:
+            try:
+                with open(os.path.join(diry, m), 'rb') as fp:
+                    h.update(b'\0' + normalize(m).encode('utf-8') + b'\0' + _digest(fp.read()).encode('utf-8'))
+            except OSError:
+                pass
+        if packages:
+            package_dirs = sorted(rel_dir for rel_dir, _, filenames in self._index.walk(diry) if '__init__.py' in filenames)
+            h.update(json.dumps(package_dirs).encode('utf-8'))
+        return h.hexdigest()
+
+    def _path(self, kind: str, diry: str) -> str:
+        key = _digest('\0'.join([kind, self._index.relpath(diry)]).encode('utf-8'))
+        return os.path.join(self._dir, key[:2], key + '.json')
+
+def installed_versions() -> List[str]:
+    """ Return name==version of each distribution installed on sys.path, as it is now. """
+    # A new WorkingSet, as installs since pkg_resources was imported aren't
+    # in the global one.
+    return sorted('{}=={}'.format(d.project_name, d.version) for d in pkg_resources.WorkingSet())
+
+@lru_cache()
+def grapher_version() -> str:
+    """ Return a hash of the grapher sources. """
+    h = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.py'))):
+        with open(path, 'rb') as fp:
+            h.update(fp.read())
+    return h.hexdigest()
+
+def _file_digest(f: str) -> str:
+    """ Return the digest of the contents of file f, or None if it can't be read. """
+    try:
+        with open(f, 'rb') as fp:
+            return _digest(fp.read())
+    except OSError:
+        return None
+
+def _digest(b: bytes) -> str:
+    return hashlib.sha1(b).hexdigest()
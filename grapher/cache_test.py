@@ -0,0 +1,133 @@
+import os
+import os.path
+import tempfile
+import time
+import unittest
+
+from unittest import mock
+
+from grapher import cache
+from grapher.cache import GraphCache, ScanCache
+from grapher.fileindex import FileIndex
+from grapher.pathtrie import PathTrie
+from grapher.structures import Unit
+
+class TestGraphCache(unittest.TestCase):
+    """
+    Tests for GraphCache.
+    """
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.dir = d.name
+        self.cache_dir = os.path.join(d.name, 'cache')
+        self.file = os.path.join(self.dir, 'a.py')
+        self.other = os.path.join(self.dir, 'b.py')
+        self.unit = Unit(Name='u', Type='PipPackage', Files=[self.file, self.other], Dir='.')
+        self.write('x = 1')
+        self.write('y = 1', self.other)
+
+    def write(self, contents, path=None):
+        with open(path or self.file, 'w') as fp:
+            fp.write(contents)
+
+    def cache(self, max_size=1 << 20, options=None, versions=None):
+        with mock.patch.object(cache, 'installed_versions', return_value=versions or ['six==1.10.0']):
+            return GraphCache(self.cache_dir, max_size, self.unit, PathTrie(), options or {'fast': False})
+
+    def test_keys(self):
+        key = self.cache().key(self.file)
+        self.assertEqual(key, self.cache().key(self.file))
+        self.assertNotEqual(key, self.cache(options={'fast': True}).key(self.file))
+        # Upgrading a dependency invalidates refs into it.
+        self.assertNotEqual(key, self.cache(versions=['six==1.11.0']).key(self.file))
+        # So do changes to the file or to other files of the unit, which its
+        # refs may resolve into.
+        self.write('y = 2', self.other)
+        self.assertNotEqual(key, self.cache().key(self.file))
+        self.write('y = 1', self.other)
+        self.assertEqual(key, self.cache().key(self.file))
+        self.write('x = 2')
+        self.assertNotEqual(key, self.cache().key(self.file))
+        self.assertIsNone(self.cache().key(os.path.join(self.dir, 'missing.py')))
+
+    def test_get_put(self):
+        c = self.cache()
+        key = c.key(self.file)
+        self.assertFalse(c.contains(key))
+        self.assertIsNone(c.get(key))
+        c.put(key, ([{'Name': 'x'}], [], []))
+        self.assertTrue(c.contains(key))
+        self.assertEqual(([{'Name': 'x'}], [], []), c.get(key))
+        self.assertEqual((1, 1), (c.hits, c.misses))
+
+    def test_evict(self):
+        c = self.cache()
+        keys = []
+        for i in range(3):
+            self.write('x = {}'.format(i))
+            keys.append(self.cache().key(self.file))
+            c.put(keys[-1], ([{'Name': 'x' * 100}], [], []))
+        size = os.path.getsize(c._path(keys[0]))
+        # The first entry is used last, so the second is the least recently used.
+        for i, key in enumerate([keys[1], keys[2], keys[0]]):
+            os.utime(c._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+        c = self.cache(max_size=2 * size)
+        self.assertEqual(1, c.evict())
+        self.assertEqual([True, False, True], [c.contains(k) for k in keys])
+        self.assertEqual(0, c.evict())
+
+class TestScanCache(unittest.TestCase):
+    """
+    Tests for ScanCache.
+    """
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.root = os.path.join(d.name, 'repo')
+        self.cache_dir = os.path.join(d.name, 'cache')
+        for f in ['setup.py', 'requirements.txt', 'pkg/__init__.py']:
+            self.write(f, 'x')
+
+    def write(self, f, contents):
+        path = os.path.join(self.root, f)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(contents)
+
+    def cache(self):
+        return ScanCache(self.cache_dir, FileIndex(self.root))
+
+    def test_get_put(self):
+        cache = self.cache()
+        self.assertEqual((False, None), cache.get('info', self.root))
+        cache.put('info', self.root, {'name': 'pkg'})
+        self.assertEqual((True, {'name': 'pkg'}), self.cache().get('info', self.root))
+        self.assertEqual((False, None), cache.get('reqs', self.root))
+
+    def test_manifest_change(self):
+        self.cache().put('info', self.root, 1)
+        self.write('requirements.txt', 'y')
+        self.assertFalse(self.cache().get('info', self.root)[0])
+
+    def test_package_change(self):
+        self.cache().put('info', self.root, 1, packages=True)
+        self.cache().put('reqs', self.root, 2)
+        self.write('pkg/sub/__init__.py', '')
+        self.assertFalse(self.cache().get('info', self.root, packages=True)[0])
+        # Other modules don't matter, nor do packages to other kinds.
+        self.write('pkg/mod.py', '')
+        self.assertEqual((True, 2), self.cache().get('reqs', self.root))
+
+    def test_nested_requirements_change(self):
+        self.write('requirements.txt', '-r reqs/base.txt\n')
+        self.write('reqs/base.txt', 'six\n')
+        self.cache().put('reqs', self.root, 1)
+        self.assertTrue(self.cache().get('reqs', self.root)[0])
+        self.write('reqs/base.txt', 'six==1.10.0\n')
+        self.assertFalse(self.cache().get('reqs', self.root)[0])
+
+    def test_settings(self):
+        self.cache().put('reqs', self.root, 1)
+        offline = ScanCache(self.cache_dir, FileIndex(self.root), {'offline': True})
+        self.assertFalse(offline.get('reqs', self.root)[0])
@@ -1,5 +1,6 @@
 from .structures import *
 from .util import normalize
+from .fileindex import FileIndex
 
 from . import pydepwrap
 
@@ -13,15 +14,22 @@ log = logging.getLogger('srclib-python.grapher.django')
 #   directory also contains a requirements.txt file, its dependencies
 #   will be included in all found source units.
 # - max_depth is the maximum recursion depth to search for units.
-def find_units(diry: str, max_depth: int = 5) -> List[Unit]:
-    units = find_units_(diry, max_depth = max_depth)
+# - index is the FileIndex to look up directories and files in; by default,
+#   an index of diry is built.
+# - requirements_txt returns the resolved requirements in the requirements.txt
+#   file of a directory.
+def find_units(diry: str, max_depth: int = 5, index: FileIndex = None,
+               requirements_txt: Callable[[str], List[Dict]] = pydepwrap.requirements_from_requirements_txt) -> List[Unit]:
+    if index is None:
+        index = FileIndex(diry)
+    units = find_units_(diry, max_depth = max_depth, index = index)
 
     global_requirements = None # type: List[Dict]
     if os.path.isfile(os.path.join(diry, "requirements.txt")):
-        global_requirements = pydepwrap.requirements_from_requirements_txt(diry)
+        global_requirements = requirements_txt(diry)
 
     for unit in units:
-        unit.Files = sorted(get_source_files(unit.Dir))
+        unit.Files = sorted(index.source_files(unit.Dir))
         for i in range(len(unit.Files)):
             f = normalize(os.path.join(unit.Dir, unit.Files[i]))
             if f.startswith('./'):
@@ -34,7 +42,7 @@ def find_units(diry: str, max_depth: int = 5) -> List[Unit]:
             reqs.extend(global_requirements)
             reqfiles.append(normalize(os.path.join(diry, "requirements.txt")))
         try:
-            reqs_ = pydepwrap.requirements_from_requirements_txt(unit.Dir)
+            reqs_ = requirements_txt(unit.Dir)
             reqs.extend(reqs_)
             reqfiles.append(normalize(os.path.join(diry, "requirements.txt")))
         except Exception as e:
@@ -60,13 +68,20 @@ def find_units(diry: str, max_depth: int = 5) -> List[Unit]:
     return units
 
 # find_units_ is a recursive helper that generates the list of proto-units.
-def find_units_(diry: str, max_depth: int = 5) -> List[Unit]:
+def find_units_(diry: str, max_depth: int = 5, index: FileIndex = None) -> List[Unit]:
     if os.path.basename(diry) == "testdata":
         return []               # don't descend into testdata/ directory
 
     if max_depth < 0: return []
 
-    if os.path.isfile(os.path.join(diry, "manage.py")):
+    if index is None:
+        index = FileIndex(diry)
+    listing = index.listing(diry)
+    if listing is None:
+        return []
+    dirnames, filenames = listing
+
+    if "manage.py" in filenames:
         return [Unit(
             Name = os.path.basename(os.path.abspath(diry)),
             Type = UNIT_DJANGO,
@@ -80,7 +95,6 @@ def find_units_(diry: str, max_depth: int = 5) -> List[Unit]:
         )]
 
     units = []
-    for entry in os.scandir(diry): # type: ignore (os.scandir exists)
-        if entry.is_dir():
-            units.extend(find_units_(entry.path, max_depth = max_depth - 1))
+    for d in dirnames:
+        units.extend(find_units_(os.path.join(diry, d), max_depth = max_depth - 1, index = index))
     return units
@@ -6,6 +6,10 @@ import jedi
 
 from .structures import *
 from .util import normalize
+from .reftable import RefTable
+from .pathtrie import PathTrie
+from .profile import NULL_PROFILE
+from .budget import Deadlines, BudgetExceeded
 
 def _debug_print_tree(node, indent=0, func=repr):
     """ Print visual representation of Jedi AST. """
@@ -21,37 +25,189 @@ def _debug_print_tree(node, indent=0, func=repr):
 class FileGrapherException(Exception):
     """ Something went wrong while graphing the file. """
 
+# ResolvedRef is what a reference resolves to: the key of its definition and
+# whether that definition is in a builtin module.
+ResolvedRef = NamedTuple('ResolvedRef', [
+    ('DefKey', DefKey),
+    ('ToBuiltin', bool),
+])
+
+class ResolutionCache(object):
+    """
+    ResolutionCache memoizes reference resolution across the files of a unit.
+
+    Following a reference means walking a chain of goto_assignments() calls,
+    and the references to the same imported name in different files all end
+    up walking the same tail of that chain. The cache maps each definition
+    reached on a walk, identified by module path, dotted name and position, to the
+    ResolvedRef the walk ended in (or None if it found nothing), so a later
+    walk that reaches the same definition stops there. Only names in import
+    statements and the definitions they lead to are cached.
+    """
+    def __init__(self):
+        self._resolved = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        """ Returns (found, resolved ref) for key. """
+        try:
+            resolved = self._resolved[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, resolved
+
+    def add(self, keys, resolved):
+        for key in keys:
+            self._resolved[key] = resolved
+
+class PathContext(object):
+    """
+    PathContext classifies the module paths of definitions for the graphers of
+    all files in a unit. It indexes the unit directory, the entries of
+    syspath and the virtualenv by path prefix, and memoizes the
+    classification of each absolute module path, as many definitions share a
+    module.
+
+    modulePathPrefixToDep is a PathTrie from module path prefixes to the unit
+    keys of dependencies, and stdlib_modules is the result of
+    stdlib_module_paths(syspath), which is computed if not given. The
+    entries of syspath in the working directory, which that leaves out, are
+    looked up on the filesystem instead.
+    """
+    def __init__(self, base_dir, syspath, modulePathPrefixToDep, stdlib_modules=None):
+        self._abs_base_dir = os.path.abspath(base_dir)
+        self._syspath = PathTrie()
+        for p in syspath:
+            if p != '':
+                self._syspath.insert(p, p)
+        self._virtual_env = os.getenv('VIRTUAL_ENV')
+        self._modulePathPrefixToDep = modulePathPrefixToDep
+        if stdlib_modules is None:
+            stdlib_modules = stdlib_module_paths(syspath)
+        self._stdlib_modules = stdlib_modules
+        self._local_syspath = [p for p in syspath if _is_local(p) and not p.endswith('site-packages')]
+        self._classified = {}
+
+    def classify(self, module_path):
+        """
+        Returns (relative module path, is_internal, dep) for an absolute module
+        path, where dep is the unit key of the dependency that provides the
+        module, or None if it is internal. Raises an exception if the module
+        path is outside of the unit, syspath and virtualenv, or if no
+        dependency provides it.
+        """
+        try:
+            classified = self._classified[module_path]
+        except KeyError:
+            classified = self._classified[module_path] = self._classify(module_path)
+        rel_path, is_internal, dep, err = classified
+        if err is not None:
+            raise Exception(err)
+        return rel_path, is_internal, dep
+
+    def _classify(self, module_path):
+        rel_path, is_internal = self._rel_module_path(module_path)
+        if rel_path is None:
+            return None, False, None, 'could not find name for module path %s' % module_path
+        if is_internal:
+            return rel_path, True, None, None
+        dep, err = self._module_to_dep(rel_path)
+        return rel_path, False, dep, err
+
+    # _rel_module_path returns (relative_module_path, is_internal)
+    def _rel_module_path(self, module_path):
+        if _has_path_prefix(module_path, self._abs_base_dir):
+            return normalize(os.path.relpath(module_path, self._abs_base_dir)), True # internal
+
+        found = self._syspath.longest_prefix(module_path)
+        if found is not None:
+            return normalize(os.path.relpath(module_path, found[1])), False # external
+
+        if self._virtual_env is not None and _has_path_prefix(module_path, self._virtual_env):
+            module_path = normalize(os.path.relpath(module_path, self._virtual_env))
+            if '/site-packages/' in module_path:
+                return module_path.split('/site-packages/', 1)[1], False
+
+        return None, False
+
+    def _module_to_dep(self, m):
+        # Check explicit pip dependencies
+        found = self._modulePathPrefixToDep.longest_prefix(_module_name_path(m))
+        if found is not None:
+            return found[1], None
+        if m in self._stdlib_modules or any(os.path.lexists(os.path.join(p, m)) for p in self._local_syspath):
+            # Standard lib module
+            return UnitKey(Repo=STDLIB_UNIT_KEY.Repo,
+                           Type=STDLIB_UNIT_KEY.Type,
+                           Name=STDLIB_UNIT_KEY.Name,
+                           CommitID=STDLIB_UNIT_KEY.CommitID,
+                           Version=STDLIB_UNIT_KEY.Version), None
+        return None, ('could not find dep module for module %s, candidates were %s' % (m, repr(self._modulePathPrefixToDep.keys())))
+
 class FileGrapher(object):
     """
     FileGrapher is used to extract definitions and references from single Python source file.
     """
     _exported_regex = re.compile('\_[a-zA-Z0-9]')
 
-    def __init__(self, base_dir, source_file, unit, unit_type, modulePathPrefixToDep, syspath, log):
+    def __init__(self, base_dir, source_file, unit, unit_type, modulePathPrefixToDep, syspath, log,
+                 resolution_cache=None, stdlib_modules=None, profile=None, session=None,
+                 file_budget=None, ref_budget=None, fast=False, path_context=None, symbol_index=None):
         """
-        Create a new grapher.
+        Create a new grapher. modulePathPrefixToDep is a PathTrie from module path
+        prefixes to the unit keys of dependencies. Pass the same resolution_cache
+        and path_context (a PathContext, which is built from
+        modulePathPrefixToDep, syspath and stdlib_modules if not given) to the
+        graphers of all files in a unit to share them. Pass an AnalysisSession as session to reuse
+        Jedi's inference results across files; the caller must call its
+        end_file() once done with the grapher. Pass a FileProfile as profile
+        to record where the time goes.
+
+        file_budget and ref_budget are wall-clock budgets in seconds for
+        graphing the file and for resolving a single reference (None for no
+        budget). When the file budget runs out, graph() returns the defs and
+        refs found so far; a reference whose budget runs out is skipped.
+        Either way, degraded is set to the reason afterwards.
+
+        In fast mode, defs are formatted with their bare name and no type, and
+        no docs are extracted, which saves the Jedi inference both require.
+
+        Pass a SymbolIndexes as symbol_index to resolve names imported from
+        indexed distributions without having Jedi analyze them.
         """
         self._base_dir = base_dir
-        self._abs_base_dir = os.path.abspath(base_dir)
         self._file = source_file
         self._unit = unit
         self._unit_type = unit_type
-        self._modulePathPrefixToDep = modulePathPrefixToDep
-        self._syspath = list(reversed(sorted(syspath)))
-        self._virtual_env = os.getenv('VIRTUAL_ENV')
+        if path_context is None:
+            path_context = PathContext(base_dir, syspath, modulePathPrefixToDep, stdlib_modules)
+        self._paths = path_context
+        self._symbols = symbol_index
+        self._import_locations = {}
         self._log = log
+        self._resolutions = resolution_cache if resolution_cache is not None else ResolutionCache()
+        self._profile = profile if profile is not None else NULL_PROFILE
+        self._session = session
+        self._file_budget = file_budget
+        self._ref_budget = ref_budget
+        self._deadlines = Deadlines()
+        self.degraded = None
+        self._skipped_refs = 0
+        self._fast = fast
         self._source = None
         self._defs = {}
-        self._refs = {}
+        self._refs = RefTable()
         self._docs = {}
         self._load()
 
-        self._stdlibpaths = []
-        for p in syspath:
-            if not p.endswith('site-packages'):
-                self._stdlibpaths.append(p)
-
     def graph(self):
+        with self._deadlines.limit(self._file_budget) as deadline:
+            return self._graph(deadline)
+
+    def _graph(self, deadline):
         # Add module/package defs.
         basic_module_path = normalize(os.path.relpath(self._file, self._base_dir))
         name = os.path.basename(basic_module_path)
@@ -86,9 +242,20 @@ class FileGrapher(object):
         ))
         # TODO(beyang): extract module/package-level doc.
 
+        # Counted up front, so that degraded files, which return early, have
+        # their size in the profile too.
+        self._profile.count('bytes', len(self._source.encode('utf-8')))
+
         # Get occurrences of names via Jedi.
         try:
-            jedi_names = jedi.names(source=self._source, path=self._file, all_scopes=True, references=True)
+            with self._profile.phase('names'), self._deadlines.interruptible():
+                if self._session is not None:
+                    jedi_names = self._session.names(self._source, self._file)
+                else:
+                    jedi_names = jedi.names(source=self._source, path=self._file, all_scopes=True, references=True)
+        except BudgetExceeded:
+            self._degrade('time budget ran out in jedi.names')
+            return self._defs, self._refs, self._docs
         except Exception as e:
             raise FileGrapherException('failed to parse {}: {}'.format(self._file, str(e)))
 
@@ -101,79 +268,177 @@ class FileGrapher(object):
                 jedi_refs.append(jedi_name)
 
         # Defs and docs.
-        for jedi_def in jedi_defs:
-            self._log.debug(
-                'processing def: %s | %s | %s',
-                jedi_def.desc_with_module,
-                jedi_def.name,
-                jedi_def.type,
-            )
-            try:
-                def_, doc = self._jedi_def_to_def(jedi_def)
-                self._add_def(def_)
-                if doc is not None and doc.Data is not None and len(doc.Data) > 0:
-                    self._add_doc(doc)
-            except Exception as e:
-                self._log.error(
-                    u'failed to process def `%s`: %s',
+        with self._profile.phase('defs'):
+            for jedi_def in jedi_defs:
+                if deadline.expired():
+                    self._degrade('time budget ran out processing defs')
+                    return self._defs, self._refs, self._docs
+                self._log.debug(
+                    'processing def: %s | %s | %s',
+                    jedi_def.desc_with_module,
                     jedi_def.name,
-                    e,
+                    jedi_def.type,
                 )
-                continue
+                try:
+                    with self._deadlines.interruptible():
+                        def_, doc = self._jedi_def_to_def(jedi_def)
+                    self._add_def(def_)
+                    if doc is not None and doc.Data is not None and len(doc.Data) > 0:
+                        self._add_doc(doc)
+                except BudgetExceeded:
+                    self._degrade('time budget ran out processing defs')
+                    return self._defs, self._refs, self._docs
+                except Exception as e:
+                    self._log.error(
+                        u'failed to process def `%s`: %s',
+                        jedi_def.name,
+                        e,
+                    )
+                    continue
 
         # Refs.
-        for jedi_ref in jedi_refs:
-            self._log.debug(
-                'processing ref: %s | %s | %s',
-                jedi_ref.desc_with_module,
-                jedi_ref.name,
-                jedi_ref.type,
-            )
-
-            ref_def = self._find_def_for_ref(jedi_ref)
-            # We found nothing.
-            if ref_def is None:
-                continue
+        groups = {} # group key -> ResolvedRef (or None)
+        saved = 0
+        with self._profile.phase('refs'):
+            for jedi_ref in jedi_refs:
+                if deadline.expired():
+                    self._degrade('time budget ran out resolving refs')
+                    break
+                self._log.debug(
+                    'processing ref: %s | %s | %s',
+                    jedi_ref.desc_with_module,
+                    jedi_ref.name,
+                    jedi_ref.type,
+                )
 
-            try:
-                sg_def = self._jedi_def_to_def_key(ref_def)
-            except Exception as e:
-                self._log.error(
-                    u'failed to process def to def-key `%s`: %s',
-                    ref_def.name,
-                    e,
+                # References that resolve alike are resolved once per group.
+                group = _ref_group_key(jedi_ref._name) if jedi_ref.type != 'import' else None
+                if group is not None and group in groups:
+                    resolved = groups[group]
+                    saved += 1
+                else:
+                    try:
+                        with self._deadlines.limit(self._ref_budget):
+                            resolved, found = self._resolve_ref(jedi_ref)
+                    except BudgetExceeded:
+                        if deadline.expired():
+                            self._degrade('time budget ran out resolving refs')
+                            break
+                        self._skipped_refs += 1
+                        self._degrade('time budget ran out resolving {} refs'.format(self._skipped_refs))
+                        continue
+                    # A ref that stands in for its own definition is named
+                    # after where it is, so its result isn't shared.
+                    if group is not None and found:
+                        groups[group] = resolved
+                # We found nothing.
+                if resolved is None:
+                    continue
+                sg_def = resolved.DefKey
+
+                ref_start = self._to_offset(jedi_ref.line, jedi_ref.column)
+                ref_end = ref_start + len(jedi_ref.name)
+
+                self._add_ref(
+                    DefRepo=sg_def.Repo,
+                    DefUnit=sg_def.Unit,
+                    DefUnitType=sg_def.UnitType,
+                    DefPath=sg_def.Path,
+                    Unit=self._unit,
+                    UnitType=self._unit_type,
+                    Def=False,
+                    File=normalize(self._file),
+                    Start=ref_start,
+                    End=ref_end,
+                    ToBuiltin=resolved.ToBuiltin,
                 )
-                continue
-
-            ref_start = self._to_offset(jedi_ref.line, jedi_ref.column)
-            ref_end = ref_start + len(jedi_ref.name)
-
-            self._add_ref(Ref(
-                DefRepo=sg_def.Repo,
-                DefUnit=sg_def.Unit,
-                DefUnitType=sg_def.UnitType,
-                DefPath=sg_def.Path,
-                Unit=self._unit,
-                UnitType=self._unit_type,
-                Def=False,
-                File=normalize(self._file),
-                Start=ref_start,
-                End=ref_end,
-                ToBuiltin=ref_def.in_builtin_module(),
-            ))
 
+        if saved > 0:
+            self._log.debug('resolved %d refs in %d groups, saving %d resolutions', saved + len(groups), len(groups), saved)
+            self._profile.count('saved_resolutions', saved)
+        if self._skipped_refs > 0:
+            self._profile.count('skipped_refs', self._skipped_refs)
+        self._profile.count('defs', len(jedi_defs))
+        self._profile.count('refs', len(jedi_refs))
         return self._defs, self._refs, self._docs
 
-    def _find_def_for_ref(self, jedi_ref, max_depth=100):
-        """ Attempt to lookup definition for the reference. If lookup fails return None. """
+    def _resolve_ref(self, jedi_ref):
+        """
+        Resolve a reference to a ResolvedRef. If resolution fails return None.
+        Returns the ResolvedRef and whether Jedi found a definition for it,
+        rather than it standing in for its own definition.
+        """
+        visited = []
+        found, resolved = self._find_def_for_ref(jedi_ref, visited=visited)
+        own = not found and resolved is jedi_ref
+        if not found:
+            ref_def = resolved
+            if ref_def is None:
+                resolved = None
+            else:
+                try:
+                    resolved = ResolvedRef(
+                        DefKey=self._jedi_def_to_def_key(ref_def),
+                        ToBuiltin=ref_def.in_builtin_module(),
+                    )
+                except Exception as e:
+                    self._log.error(
+                        u'failed to process def to def-key `%s`: %s',
+                        ref_def.name,
+                        e,
+                    )
+                    resolved = None
+        # After a budget interrupted Jedi, its memoized results for this file
+        # may be incomplete; keep them out of the shared cache.
+        if self.degraded is None:
+            self._resolutions.add(visited, resolved)
+        return resolved, not own
+
+    def _find_def_for_ref(self, jedi_ref, max_depth=100, visited=None):
+        """
+        Attempt to lookup definition for the reference. Returns (False, definition),
+        where definition is None if lookup fails. If the lookup reaches a definition
+        in the resolution cache, returns (True, cached ResolvedRef) instead. The
+        resolution cache keys of the definitions passed are appended to visited.
+        """
         ref_def = jedi_ref
+        # Only names in import statements and the definitions they lead to are
+        # memoized. How those resolve doesn't depend on the path they were
+        # reached by, unlike, e.g., attributes reached through an instance.
+        memoize = ref_def.type == "import"
         # If def is import, then follow it.
         depth = 0
-        while (not ref_def.is_definition() or ref_def.type == "import") and depth < max_depth:
+        while True:
+            if memoize:
+                key = self._resolution_key(ref_def)
+                if key is not None:
+                    found, resolved = self._resolutions.lookup(key)
+                    if found:
+                        return True, resolved
+                    if visited is not None:
+                        visited.append(key)
+                if self._symbols is not None and ref_def.type == "import":
+                    found, resolved = self._indexed_ref(ref_def)
+                    if found:
+                        return True, resolved
+
+            if not ((not ref_def.is_definition() or ref_def.type == "import") and depth < max_depth):
+                self._log.debug(
+                    'ref def search (precondition failed) | %s | %s | %s',
+                    ref_def.is_definition(),
+                    ref_def.type,
+                    ref_def.name
+                )
+                break
+
             depth += 1
+            self._profile.count('goto_calls')
             # noinspection PyBroadException
             try:
-                ref_defs = ref_def.goto_assignments()
+                with self._profile.phase('goto'), self._deadlines.interruptible():
+                    ref_defs = ref_def.goto_assignments()
+            except BudgetExceeded:
+                raise
             except:
                 self._log.error(u'jedi error getting definitions for reference {}'.format(jedi_ref))
                 break
@@ -181,21 +446,69 @@ class FileGrapher(object):
             if len(ref_defs) == 0:
                 break
 
+            followed_import = ref_def.type == "import"
             ref_def = ref_defs[0]
-        else:
-            self._log.debug(
-                'ref def search (precondition failed) | %s | %s | %s',
-                ref_def.is_definition(),
-                ref_def.type,
-                ref_def.name
-            )
+            memoize = followed_import or ref_def.type == "import"
+        self._profile.goto_depth(depth)
 
         if ref_def.type == "import":
             # We didn't find anything.
             self._log.debug('ref def not found')
-            return None
+            return False, None
+
+        return False, ref_def
+
+    def _indexed_ref(self, d):
+        """
+        Looks up a name in an absolute import statement in the symbol index.
+        Returns (found, ResolvedRef), where the ResolvedRef is None if the
+        indexed definition has no def key. The index is only used if Jedi
+        would import the module from the indexed distribution.
+        """
+        imported = _import_key(d._name)
+        if imported is None:
+            return False, None
+        top_name, key = imported
+        module = top_name.get_parent_until()
+        try:
+            location = self._import_locations[module.path, top_name.value]
+        except KeyError:
+            location = self._import_locations[module.path, top_name.value] = _import_location(d._evaluator, module, top_name)
+        if location is None:
+            return False, None
+        # Indexed names resolve alike in all files.
+        cache_key = 'symbol', location, key
+        found, resolved = self._resolutions.lookup(cache_key)
+        if found:
+            return True, resolved
+        with self._profile.phase('symbol_index'):
+            symbol = self._symbols.lookup(location, top_name.value, key)
+        if symbol is None:
+            return False, None
+        self._profile.count('indexed_refs')
+        try:
+            resolved = ResolvedRef(
+                DefKey=self._location_to_def_key(symbol.ModulePath, symbol.NamePath),
+                ToBuiltin=symbol.ModulePath is None,
+            )
+        except Exception as e:
+            self._log.error(
+                u'failed to process def to def-key `%s`: %s',
+                d.name,
+                e,
+            )
+            resolved = None
+        self._resolutions.add([cache_key], resolved)
+        return True, resolved
 
-        return ref_def
+    @staticmethod
+    def _resolution_key(d):
+        """ Returns the resolution cache key of a Jedi definition, or None if it has no position. """
+        if d.in_builtin_module() or d.module_path is None:
+            return None
+        # The dotted name is part of the key because the same definition has
+        # a different full name depending on the import path it was reached by.
+        return d.module_path, d.full_name, d.line, d.column
 
     def _load(self):
         """ Load file in memory. """
@@ -262,7 +575,11 @@ class FileGrapher(object):
             return df.name, ''
 
     def _jedi_def_to_format_data(self, df) -> DefFormatData:
-        name, typ = self._jedi_def_to_name_and_type(df)
+        if self._fast:
+            name, typ = df.name, ''
+        else:
+            with self._profile.phase('name_and_type'):
+                name, typ = self._jedi_def_to_name_and_type(df)
         keyword, sep = '', ''
         if df.type == 'function':
             keyword = 'def'
@@ -304,7 +621,10 @@ class FileGrapher(object):
         )
 
         doc = None
-        docstring = d.docstring(raw=True)
+        if self._fast:
+            return def_, doc
+        with self._profile.phase('docstring'):
+            docstring = d.docstring(raw=True)
         if docstring is not None:
             doc = Doc(
                 Unit=def_.Unit,
@@ -318,54 +638,17 @@ class FileGrapher(object):
         return def_, doc
 
     def _jedi_def_to_def_key(self, d):
-        path, dep = self._full_name_and_dep(d)
-        if dep is not None:
-            repo, unit, unit_type = dep.Repo, dep.Name, dep.Type
-        else:
-            repo, unit, unit_type = "", self._unit, self._unit_type
-        return DefKey(
-            Repo=repo,
-            Unit=unit,
-            UnitType=unit_type,
-            Path=path,
-        )
+        with self._profile.phase('def_key'):
+            return self._location_to_def_key(*self._def_location(d))
 
-    # _rel_module_path returns (relative_module_path, is_internal)
-    # TODO(beyang): replace startswith with os.path.commonpath (Python 3 function)
-    def _rel_module_path(self, module_path):
-        if module_path.startswith(self._abs_base_dir):
-            return normalize(os.path.relpath(module_path, self._abs_base_dir)), True # internal
-
-        for p in self._syspath:
-            if p == '':
-                continue
-            if module_path.startswith(p):
-                return normalize(os.path.relpath(module_path, p)), False # external
-
-        if self._virtual_env is not None and module_path.startswith(self._virtual_env):
-            module_path = normalize(os.path.relpath(module_path, self._virtual_env))
-            return module_path.split('/site-packages/', 1)[1], False
-
-        return None, False
-
-    def _module_to_dep(self, m):
-        # Check explicit pip dependencies
-        for pkg, dep in self._modulePathPrefixToDep.items():
-            if m.startswith(pkg):
-                return dep, None
-        for stdlibpath in self._stdlibpaths:
-            if os.path.lexists(os.path.join(stdlibpath, m)):
-                # Standard lib module
-                return UnitKey(Repo=STDLIB_UNIT_KEY.Repo,
-                               Type=STDLIB_UNIT_KEY.Type,
-                               Name=STDLIB_UNIT_KEY.Name,
-                               CommitID=STDLIB_UNIT_KEY.CommitID,
-                               Version=STDLIB_UNIT_KEY.Version), None
-        return None, ('could not find dep module for module %s, candidates were %s' % (m, repr(self._modulePathPrefixToDep.keys())))
-
-    def _full_name_and_dep(self, d):
+    def _def_location(self, d):
+        """
+        Returns (absolute module path, name path) of a definition, where the
+        module path is None for definitions in builtin modules. The name path
+        is the part of the def path after the module's relative path.
+        """
         if d.in_builtin_module():
-            return d.full_name, UnitKey(Repo=STDLIB_UNIT_KEY.Repo, Type=UNIT_PIP, Name="__builtin__", CommitID="", Version="")
+            return None, d.full_name
 
         if d.module_path is None:
             raise Exception('no module path for definition %s' % repr(d))
@@ -375,23 +658,28 @@ class FileGrapher(object):
         if d.type == 'param' and (d.name == 'self' or d.name == 'cls') and d.parent().parent().type == 'class':
             d = d.parent().parent()
 
-        module_path, is_internal = self._rel_module_path(d.module_path)
-        if module_path is None:
-            raise Exception('could not find name for module path %s' % d.module_path)
-
         if self._jedi_def_is_ivar(d):
             classname = self._jedi_def_ivar_classname(d)
-            path = '{}/{}.{}'.format(module_path, classname, d.name)
-        else:
-            path = '{}/{}.{}'.format(module_path, d.full_name, d.name)
-
-        dep = None
-        if not is_internal:
-            dep, err = self._module_to_dep(module_path)
-            if err is not None:
-                raise Exception(err)
+            return d.module_path, '{}.{}'.format(classname, d.name)
+        return d.module_path, '{}.{}'.format(d.full_name, d.name)
 
-        return path, dep
+    def _location_to_def_key(self, module_path, name_path):
+        """ Returns the DefKey of the definition at a location returned by _def_location. """
+        if module_path is None:
+            path, dep = name_path, UnitKey(Repo=STDLIB_UNIT_KEY.Repo, Type=UNIT_PIP, Name="__builtin__", CommitID="", Version="")
+        else:
+            rel_path, _, dep = self._paths.classify(module_path)
+            path = '{}/{}'.format(rel_path, name_path)
+        if dep is not None:
+            repo, unit, unit_type = dep.Repo, dep.Name, dep.Type
+        else:
+            repo, unit, unit_type = "", self._unit, self._unit_type
+        return DefKey(
+            Repo=repo,
+            Unit=unit,
+            UnitType=unit_type,
+            Path=path,
+        )
 
     @staticmethod
     def _get_module_parent_from_module_path(module_path):
@@ -456,7 +744,7 @@ class FileGrapher(object):
         if d.Path not in self._defs:
             self._defs[d.Path] = d
         # Add self-reference.
-        self._add_ref(Ref(
+        self._add_ref(
             DefRepo=d.Repo,
             DefUnit=d.Unit,
             DefUnitType=d.UnitType,
@@ -468,14 +756,16 @@ class FileGrapher(object):
             Start=d.DefStart,
             End=d.DefEnd,
             ToBuiltin=False,
-        ))
+        )
 
-    def _add_ref(self, r):
-        """ Add a reference. """
-        self._log.debug('adding ref: %s', r.DefPath)
-        key = (r.DefPath, r.File, r.Start, r.End)
-        if key not in self._refs:
-            self._refs[key] = r
+    def _add_ref(self, DefRepo, DefUnit, DefUnitType, DefPath, Def, Unit, UnitType, File, Start, End, ToBuiltin):
+        """ Add a reference. Takes the fields of a Ref. """
+        self._log.debug('adding ref: %s', DefPath)
+        self._refs.add(DefRepo, DefUnit, DefUnitType, DefPath, Def, Unit, UnitType, File, Start, End, ToBuiltin)
+
+    def _degrade(self, reason):
+        """ Record that the output is incomplete because of reason. """
+        self.degraded = reason
 
     def _add_doc(self, d):
         """ Add a docstring. """
@@ -496,3 +786,194 @@ class FileGrapher(object):
                 len(self._cumulative_off) - 1)
             )
         return self._cumulative_off[line] + column
+
+def stdlib_module_paths(syspath):
+    """
+    Returns the set of relative paths of all files and directories under the
+    entries of syspath that are not site-packages directories. A module path
+    relative to syspath is in the standard library if it is in this set.
+    Building it once per unit spares FileGrapher a filesystem lookup per
+    definition.
+
+    Entries in the working directory, usually the repository being graphed,
+    are left out, as walking them would list the whole repository.
+    """
+    paths = set()
+    for p in syspath:
+        if p.endswith('site-packages') or _is_local(p):
+            continue
+        # Symbolic links to directories are followed, like a lookup of the
+        # path would, except those back to a directory above them.
+        ancestors = {p: frozenset([os.path.realpath(p)])}
+        for dirpath, dirnames, filenames in os.walk(p, followlinks=True):
+            above = ancestors.pop(dirpath)
+            # Installed packages are never standard library modules.
+            dirnames[:] = [d for d in dirnames if d not in ('site-packages', 'dist-packages')]
+            rel_dir = os.path.relpath(dirpath, p)
+            for name in dirnames + filenames:
+                paths.add(normalize(os.path.normpath(os.path.join(rel_dir, name))))
+            descend = []
+            for d in dirnames:
+                real = os.path.realpath(os.path.join(dirpath, d))
+                if real not in above:
+                    ancestors[os.path.join(dirpath, d)] = above | {real}
+                    descend.append(d)
+            dirnames[:] = descend
+    return paths
+
+def _ref_group_key(name):
+    """
+    Returns the key of the group of references that name resolves with, or
+    None if it must be resolved on its own. The name must be a plain name or
+    the last name of a dotted chain of names, like `self.session`. All names
+    with the same key resolve to the same definition: the key is the dotted
+    expression, the scope it's in and the definition of its first name in
+    that scope, if any.
+
+    Names whose resolution may depend on where they are in their scope get no
+    key: first names bound more than once in the scope, or used before their
+    only binding, names in comprehensions and lambdas, names used outside
+    functions that aren't bound in the scope they're in, and names whose
+    first name is in an assert statement, which Jedi reads isinstance checks
+    from. Jedi also reads isinstance checks from the tests of the if and
+    while statements around a name, so the innermost of those is part of the
+    key.
+    """
+    parts = [name.value]
+    root = name
+    if name.parent.type == 'trailer':
+        trailer = name.parent
+        power = trailer.parent
+        if trailer.children[0] != '.' or power.type != 'power' or power.children[0].type != 'name':
+            return None
+        root = power.children[0]
+        for t in power.children[1:]:
+            if t is trailer:
+                break
+            if t.type != 'trailer' or t.children[0] != '.':
+                return None
+            parts.insert(-1, t.children[1].value)
+        parts.insert(0, root.value)
+    elif name.parent.type in ('argument', 'global_stmt', 'nonlocal_stmt') or name.is_definition():
+        # Keyword arguments and declarations resolve differently from
+        # other uses of the same name.
+        return None
+    if root.get_definition().type in ('import_name', 'import_from'):
+        return None
+
+    node = root.parent
+    while not node.is_scope():
+        if node.type == 'lambdef' or any(c.type == 'comp_for' for c in node.children):
+            return None
+        node = node.parent
+    scope = node
+    if scope.type == 'lambdef':
+        return None
+
+    # The names dicts of modules parsed by Jedi's fast parser only support
+    # item lookup.
+    try:
+        names = scope.names_dict[root.value]
+    except KeyError:
+        names = []
+    bindings = [n for n in names if n.is_definition()]
+    if len(bindings) > 1:
+        return None
+    outer = scope
+    while outer is not None:
+        try:
+            if any(_in_assert(n) for n in outer.names_dict[root.value]):
+                return None
+        except KeyError:
+            pass
+        outer = outer.get_parent_scope()
+    if len(bindings) == 1:
+        if bindings[0].start_pos >= root.start_pos:
+            return None
+        binding = bindings[0].start_pos
+    else:
+        # Outside functions, lookups in outer scopes depend on the position.
+        if scope.type != 'funcdef':
+            return None
+        binding = None
+    return '.'.join(parts), scope.type, scope.start_pos, binding, root.get_parent_scope(include_flows=True).start_pos
+
+def _in_assert(name):
+    """ Reports whether name is in an assert statement. """
+    node = name.parent
+    while node is not None and not node.is_scope():
+        if node.type == 'assert_stmt':
+            return True
+        node = node.parent
+    return False
+
+def _import_key(name):
+    """
+    Returns (first name of the module path, key) for a name in an absolute
+    import statement whose resolution depends only on the modules imported,
+    or None. Names imported without an alias by from statements are keyed by
+    their dotted path, like `a.b.c` for c in `from a.b import c`. Names in
+    module paths are keyed by the statement and the module path up to them,
+    like `from a` for a in `from a.b import c`, or `import a.b` for b in
+    `import a.b`.
+    """
+    imp = getattr(name, 'get_definition', lambda: None)()
+    if imp is None:
+        return None
+    if imp.type == 'import_from' and imp.level == 0:
+        from_names = imp.get_from_names()
+        for i, n in enumerate(from_names):
+            if n is name:
+                return from_names[0], 'from ' + '.'.join(n.value for n in from_names[:i + 1])
+        if any(n is name and alias is None for n, alias in imp._as_name_tuples()):
+            return from_names[0], '.'.join([n.value for n in from_names] + [name.value])
+    elif imp.type == 'import_name':
+        for path, alias in imp._dotted_as_names():
+            for i, n in enumerate(path):
+                if n is name and alias is None:
+                    return path[0], 'import ' + '.'.join(n.value for n in path[:i + 1])
+    return None
+
+def _import_location(evaluator, module, top_name):
+    """
+    Returns the directory that Jedi imports the top-level module top_name
+    from when it's imported in module, or None if it isn't imported from a
+    directory.
+    """
+    # These are internals of the Jedi version the grapher runs with.
+    from jedi._compatibility import find_module
+    from jedi.evaluate import imports
+
+    cached = evaluator.modules.get(top_name.value)
+    try:
+        if cached is not None:
+            path = cached.path
+            if path is None:
+                return None
+            if os.path.basename(path) == '__init__.py':
+                path = os.path.dirname(path)
+        else:
+            sys_path = imports.Importer(evaluator, (top_name,), evaluator.wrap(module)).sys_path_with_modifications()
+            module_file, path, _ = find_module(top_name.value, sys_path)
+            if module_file is not None:
+                module_file.close()
+    except (AttributeError, ImportError):
+        return None
+    if path is None:
+        return None
+    return os.path.realpath(os.path.dirname(path))
+
+def _is_local(path):
+    """ Reports whether path is in the working directory. """
+    return _has_path_prefix(os.path.abspath(path), os.getcwd())
+
+def _has_path_prefix(path, prefix):
+    """ Reports whether prefix is path or one of its parent directories. """
+    path, prefix = normalize(path), normalize(prefix).rstrip('/')
+    return path == prefix or path.startswith(prefix + '/')
+
+def _module_name_path(m):
+    """ Strips the file extension from a module path, e.g. 'six.py' becomes 'six'. """
+    head, _, tail = m.rpartition('/')
+    tail = tail.split('.', 1)[0]
+    return head + '/' + tail if head else tail
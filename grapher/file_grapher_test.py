@@ -1,5 +1,13 @@
+import os
+import os.path
+import tempfile
 import unittest
-from grapher.file_grapher import FileGrapher
+
+import jedi
+
+from grapher.file_grapher import FileGrapher, PathContext, _import_key, _ref_group_key, stdlib_module_paths
+from grapher.pathtrie import PathTrie
+from grapher.structures import UnitKey
 
 class TestFileGrapher(unittest.TestCase):
     """
@@ -24,3 +32,166 @@ class TestFileGrapher(unittest.TestCase):
                 act_module_name,
                 msg=('{}: {} != {}'.format(filepath, exp_module_name, act_module_name))
             )
+
+class TestPathContext(unittest.TestCase):
+    """
+    Tests for the classification of module paths.
+    """
+    def setUp(self):
+        self.dep = UnitKey(Repo='github.com/x/six', Type='PipPackage', Name='six', CommitID='', Version='')
+        deps = PathTrie()
+        deps.insert('six', self.dep)
+        self.paths = PathContext('/repo', ['', '/usr/lib/python3', '/usr/lib/python3/site-packages'], deps,
+                                 stdlib_modules={'os.py'})
+
+    def test_classify(self):
+        self.assertEqual(('pkg/mod.py', True, None), self.paths.classify('/repo/pkg/mod.py'))
+        self.assertEqual(('six.py', False, self.dep), self.paths.classify('/usr/lib/python3/site-packages/six.py'))
+        self.assertEqual('os.py', self.paths.classify('/usr/lib/python3/os.py')[0])
+        # Cached classifications are the same.
+        self.assertEqual(('six.py', False, self.dep), self.paths.classify('/usr/lib/python3/site-packages/six.py'))
+
+    def test_classify_errors(self):
+        # /repo2 is not in /repo.
+        with self.assertRaises(Exception):
+            self.paths.classify('/repo2/mod.py')
+        with self.assertRaises(Exception):
+            self.paths.classify('/usr/lib/python3/site-packages/unknown.py')
+        with self.assertRaises(Exception):
+            self.paths.classify('/usr/lib/python3/site-packages/unknown.py')
+
+@unittest.skipUnless(jedi.__version__.startswith('0.9.'), 'needs the Jedi parser tree of jedi==0.9.0')
+class TestRefGroupKey(unittest.TestCase):
+    """
+    Tests for the grouping of references that resolve alike.
+    """
+    source = '''import os
+
+class A(object):
+    def f(self, x):
+        self.session.get(x)
+        self.session.put(x)
+        y = x
+        y = os.path.join(y, y)
+        return [z for z in x], len(x), len(x), f(key=x), x().attr
+'''
+
+    def keys(self, value, source=None):
+        """ Returns the group keys of the names with the given value, in order. """
+        from jedi.parser import Parser, load_grammar
+        module = Parser(load_grammar(), source or self.source).module
+        keys = []
+        def walk(node):
+            if node.type == 'name' and node.value == value:
+                keys.append(_ref_group_key(node))
+            for c in getattr(node, 'children', []):
+                walk(c)
+        walk(module)
+        return keys
+
+    def test_group_key(self):
+        session = self.keys('session')
+        self.assertIsNotNone(session[0])
+        self.assertEqual(session[0], session[1])
+        self.assertEqual(session[0][0], 'self.session')
+        self.assertNotEqual(self.keys('get')[0], self.keys('put')[0])
+        # Builtins looked up from a function.
+        length = self.keys('len')
+        self.assertIsNotNone(length[0])
+        self.assertEqual(length[0], length[1])
+
+    def test_no_group_key(self):
+        # Bound twice in its scope.
+        self.assertEqual(self.keys('y'), [None] * 4)
+        # Not a plain dotted chain.
+        self.assertEqual(self.keys('attr'), [None])
+        # In a comprehension, a keyword argument or an import.
+        self.assertEqual(self.keys('z'), [None, None])
+        self.assertEqual(self.keys('key'), [None])
+        self.assertIsNone(self.keys('os')[0])
+
+    def test_isinstance(self):
+        """ Check that names Jedi may narrow with isinstance checks are grouped by flow, or not at all. """
+        source = '''def g(x, y):
+    if isinstance(x, int):
+        x.real
+        x.real
+    x.real
+    assert isinstance(y, str)
+    y.upper
+'''
+        real = self.keys('real', source)
+        self.assertIsNotNone(real[0])
+        self.assertEqual(real[0], real[1])
+        self.assertNotEqual(real[0], real[2])
+        self.assertEqual([None], self.keys('upper', source))
+
+@unittest.skipUnless(jedi.__version__.startswith('0.9.'), 'needs the Jedi parser tree of jedi==0.9.0')
+class TestImportKey(unittest.TestCase):
+    """
+    Tests for the symbol index keys of names in import statements.
+    """
+    def test_import_key(self):
+        from jedi.parser import Parser, load_grammar
+        module = Parser(load_grammar(), 'from a.b import c, d as e\nimport x.y, z as w\nfrom . import q\nf = c\n').module
+        keys = {}
+        def walk(node):
+            if node.type == 'name':
+                key = _import_key(node)
+                keys[node.value, node.start_pos[0]] = key and (key[0].value, key[1])
+            for c in getattr(node, 'children', []):
+                walk(c)
+        walk(module)
+        self.assertEqual({
+            ('a', 1): ('a', 'from a'),
+            ('b', 1): ('a', 'from a.b'),
+            ('c', 1): ('a', 'a.b.c'),
+            ('d', 1): None,
+            ('e', 1): None,
+            ('x', 2): ('x', 'import x'),
+            ('y', 2): ('x', 'import x.y'),
+            ('z', 2): None,
+            ('w', 2): None,
+            ('q', 3): None,
+            ('f', 4): None,
+            ('c', 4): None,
+        }, keys)
+
+class TestStdlibModulePaths(unittest.TestCase):
+    """
+    Tests for stdlib_module_paths.
+    """
+    def test_symlinks(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        lib, shared = os.path.join(d.name, 'lib'), os.path.join(d.name, 'shared')
+        for f in [os.path.join(lib, 'os.py'), os.path.join(lib, 'site-packages', 'six.py'), os.path.join(shared, 'json', '__init__.py')]:
+            os.makedirs(os.path.dirname(f), exist_ok=True)
+            open(f, 'w').close()
+        os.symlink(os.path.join(shared, 'json'), os.path.join(lib, 'json'))
+        os.symlink(lib, os.path.join(shared, 'json', 'loop'))
+        paths = stdlib_module_paths([lib, os.path.join(lib, 'site-packages')])
+        self.assertIn('json/__init__.py', paths)
+        # Links back up the tree are listed but not followed.
+        self.assertIn('json/loop', paths)
+        self.assertNotIn('json/loop/os.py', paths)
+        self.assertNotIn('site-packages/six.py', paths)
+        self.assertNotIn('six.py', paths)
+
+    def test_working_directory(self):
+        """ Check that syspath entries in the working directory are looked up rather than listed. """
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        repo, lib = os.path.join(d.name, 'repo'), os.path.join(d.name, 'lib')
+        for f in [os.path.join(repo, 'pkg', 'mod.py'), os.path.join(lib, 'os.py')]:
+            os.makedirs(os.path.dirname(f), exist_ok=True)
+            open(f, 'w').close()
+        cwd = os.getcwd()
+        os.chdir(repo)
+        self.addCleanup(os.chdir, cwd)
+        syspath = ['', repo, os.path.join(repo, 'pkg'), lib]
+        paths = stdlib_module_paths(syspath)
+        self.assertEqual({'os.py'}, paths)
+        context = PathContext(os.path.join(repo, 'pkg'), syspath, PathTrie(), stdlib_modules=paths)
+        self.assertEqual('os.py', context.classify(os.path.join(lib, 'os.py'))[0])
+        self.assertEqual('pkg/mod.py', context.classify(os.path.join(lib, 'pkg', 'mod.py'))[0])
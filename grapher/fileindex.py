@@ -0,0 +1,108 @@
+import os
+import os.path
+
+from typing import Dict, Iterator, List, Set, Tuple
+
+from .structures import get_source_files
+from .util import normalize
+
+# PRUNED_DIRS are the names of directories that never contain source units.
+PRUNED_DIRS = frozenset(['.git', '.hg', '.svn', 'node_modules', 'testdata', '__pycache__'])
+
+class FileIndex:
+    """
+    FileIndex lists the directories and files under a root directory. It is
+    built in a single scandir pass, which skips the directories named in
+    pruned as well as virtualenvs, so scan can look up directory contents
+    without walking the tree again for each unit.
+
+    Like os.walk, the index doesn't descend into symbolic links to
+    directories. Queries take absolute paths or paths relative to the current
+    directory, like the functions they replace.
+    """
+    def __init__(self, root: str, pruned: Set[str] = PRUNED_DIRS) -> None:
+        self._root = os.path.abspath(root)
+        self._pruned = pruned
+        # _listings maps the path of each indexed directory relative to the
+        # root ('.' for the root) to its (dirnames, filenames), and _order
+        # holds those paths in the order os.walk would visit them.
+        self._listings = {} # type: Dict[str, Tuple[List[str], List[str]]]
+        self._order = [] # type: List[str]
+        self._build()
+
+    def _build(self) -> None:
+        stack = ['.']
+        while stack:
+            rel = stack.pop()
+            dirnames, filenames, descend = [], [], [] # type: List[str], List[str], List[str]
+            try:
+                for entry in os.scandir(os.path.join(self._root, rel)): # type: ignore (os.scandir exists)
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        filenames.append(entry.name)
+                        continue
+                    dirnames.append(entry.name)
+                    if entry.name not in self._pruned and not entry.is_symlink():
+                        descend.append(entry.name)
+            except OSError:
+                continue
+            if rel != '.' and _is_virtualenv(os.path.join(self._root, rel), dirnames, filenames):
+                continue
+            self._listings[rel] = (dirnames, filenames)
+            self._order.append(rel)
+            for name in reversed(descend):
+                stack.append(name if rel == '.' else rel + '/' + name)
+
+    def relpath(self, diry: str) -> str:
+        """ Returns the path of diry relative to the root, with forward slashes. """
+        return normalize(os.path.relpath(os.path.abspath(diry), self._root))
+
+    def listing(self, diry: str) -> Tuple[List[str], List[str]]:
+        """ Returns the (dirnames, filenames) of diry, or None if it isn't indexed. """
+        return self._listings.get(self.relpath(diry))
+
+    def dirs_with(self, filename: str) -> List[str]:
+        """ Returns the paths of the indexed directories that contain filename, like os.walk(root) would name them. """
+        return [self._root if rel == '.' else os.path.join(self._root, *rel.split('/'))
+                for rel in self._order if filename in self._listings[rel][1]]
+
+    def walk(self, diry: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """
+        Like os.walk(diry), but yields the path of each directory relative to
+        diry, ending in a slash ('' for diry itself), and skips the
+        directories that aren't indexed. Yields nothing if diry isn't indexed.
+        """
+        key = self.relpath(diry)
+        if key not in self._listings:
+            return
+        stack = [(key, '')]
+        while stack:
+            rel, rel_dir = stack.pop()
+            dirnames, filenames = self._listings[rel]
+            yield rel_dir, dirnames, filenames
+            for d in reversed(dirnames):
+                child = d if rel == '.' else rel + '/' + d
+                if child in self._listings:
+                    stack.append((child, rel_dir + d + '/'))
+
+    def source_files(self, diry: str) -> List[str]:
+        """ Like get_source_files(diry). Directories outside of the index are walked. """
+        if self.listing(diry) is None:
+            return get_source_files(diry)
+        files = [] # type: List[str]
+        for rel_dir, _, filenames in self.walk(diry):
+            files.extend(rel_dir + f for f in filenames if os.path.splitext(f)[1] == '.py')
+        return files
+
+def _is_virtualenv(path: str, dirnames: List[str], filenames: List[str]) -> bool:
+    """ Reports whether the directory at path, with the given contents, is a virtualenv. """
+    if 'pyvenv.cfg' in filenames:
+        return True
+    for bindir in ('bin', 'Scripts'):
+        if bindir in dirnames and ('lib' in dirnames or 'Lib' in dirnames):
+            if os.path.exists(os.path.join(path, bindir, 'activate_this.py')) or os.path.exists(os.path.join(path, bindir, 'activate')):
+                return True
+    return False
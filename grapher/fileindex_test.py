@@ -0,0 +1,42 @@
+import os
+import os.path
+import tempfile
+import unittest
+
+from grapher.fileindex import FileIndex
+from grapher.structures import get_source_files
+
+class TestFileIndex(unittest.TestCase):
+    """
+    Tests for FileIndex.
+    """
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.root = d.name
+        for f in ['setup.py', 'pkg/__init__.py', 'pkg/sub/mod.py', 'pkg/sub/data.txt', 'pkg/testdata/fixture.py',
+                  '.git/hooks/hook.py', 'node_modules/x/y.py', 'env/bin/activate', 'env/lib/site.py',
+                  'venv/pyvenv.cfg', 'venv/lib/site.py', 'other/setup.py']:
+            path = os.path.join(self.root, f)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        self.index = FileIndex(self.root)
+
+    def test_source_files(self):
+        self.assertEqual(['other/setup.py', 'pkg/__init__.py', 'pkg/sub/mod.py', 'setup.py'],
+                         sorted(self.index.source_files(self.root)))
+        pkg = os.path.join(self.root, 'pkg')
+        self.assertEqual(['__init__.py', 'sub/mod.py'], sorted(self.index.source_files(pkg)))
+        # Directories that were pruned are walked.
+        testdata = os.path.join(pkg, 'testdata')
+        self.assertEqual(get_source_files(testdata), self.index.source_files(testdata))
+        self.assertEqual([], self.index.source_files(os.path.join(self.root, 'missing')))
+
+    def test_dirs_with(self):
+        self.assertEqual([self.root, os.path.join(self.root, 'other')], sorted(self.index.dirs_with('setup.py')))
+
+    def test_listing(self):
+        dirnames, filenames = self.index.listing(os.path.join(self.root, 'pkg', 'sub'))
+        self.assertEqual(([], ['data.txt', 'mod.py']), (dirnames, sorted(filenames)))
+        self.assertIsNone(self.index.listing(os.path.join(self.root, 'env')))
+        self.assertIsNone(self.index.listing(os.path.join(self.root, 'venv')))
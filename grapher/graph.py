@@ -1,20 +1,32 @@
 import sys
 import json
 import logging
-import pip
 import os.path
 
+from itertools import starmap
 from subprocess import call
 
 from .structures import *
-from .file_grapher import FileGrapher, FileGrapherException
+from .file_grapher import FileGrapher, FileGrapherException, ResolutionCache, PathContext, stdlib_module_paths
+from .pathtrie import PathTrie
+from .util import pool_imap, cpu_jobs
+from .writer import GraphWriter
+from .cache import GraphCache
+from .installs import InstallFingerprints, local_inputs, requirements_inputs
+from .profile import FileProfile, NULL_PROFILE, summarize
+from .session import AnalysisSession
+from .symbolindex import SymbolIndexes
 from . import builtin
 
-def getModulePathPrefixToDep(u: Unit) -> Dict[str, UnitKey]:
+def getModulePathPrefixToDep(u: Unit) -> PathTrie:
+    """
+    Returns a trie that maps module path prefixes (e.g., 'requests' or
+    'six') to the unit keys of the requirements that provide them.
+    """
+    prefixToDep = PathTrie()
     if not u.Data:
-        return {}
+        return prefixToDep
 
-    prefixToDep = {}
     for req in u.Data.Reqs:
         if req['repo_url']:
             repo, unit, unit_type = req['repo_url'], req['project_name'], UNIT_PIP
@@ -23,21 +35,26 @@ def getModulePathPrefixToDep(u: Unit) -> Dict[str, UnitKey]:
 
         if req['packages'] is not None:
             for pkg in req['packages']:
-                prefixToDep[pkg.replace('.', '/')] = UnitKey(Repo=repo, Name=unit, Type=unit_type, CommitID="", Version="")
+                prefixToDep.insert(pkg.replace('.', '/'), UnitKey(Repo=repo, Name=unit, Type=unit_type, CommitID="", Version=""))
         if req['modules'] is not None:
             for mod in req['modules']:
-                prefixToDep[mod] = UnitKey(Repo=repo, Name=unit, Type=unit_type, CommitID="", Version="")
+                prefixToDep.insert(mod.replace('.', '/'), UnitKey(Repo=repo, Name=unit, Type=unit_type, CommitID="", Version=""))
 
     # setuptools special case
-    prefixToDep['setuptools'] = SETUPTOOLS_UNIT_KEY
+    prefixToDep.insert('setuptools', SETUPTOOLS_UNIT_KEY)
 
     return prefixToDep
 
 def graph(args, fp) -> None:
-    # Setup logging to stderr
+    logger = setup_logger(args)
+    u = fromJSONable(json.load(fp), Unit) # type: Unit
+    graphunit(logger, args, u)
+
+def setup_logger(args):
+    """ Setup logging to stderr at the level requested by args. """
     logger = logging.getLogger(__name__)
-    handler = logging.StreamHandler()
-    logger.addHandler(handler)
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
     logger.setLevel(logging.ERROR)
     if args.debug:
         logger.setLevel(logging.DEBUG)
@@ -45,59 +62,191 @@ def graph(args, fp) -> None:
         logger.setLevel(logging.INFO)
     elif args.quiet:
         logger.setLevel(logging.CRITICAL)
-
-    u = fromJSONable(json.load(fp), Unit) # type: Unit
-    graphunit(logger, args, u)
-
-def graphunit(logger, args, u: Unit) -> None:
+    return logger
+
+# FileResult is the outcome of graphing a file: its JSON-able (defs, refs,
+# docs), or None on failure; its profile record, or None if profiling is
+# disabled; and why its graph is incomplete, or None if it is complete.
+FileResult = NamedTuple('FileResult', [
+    ('Graph', Tuple[List[Dict], List[Dict], List[Dict]]),
+    ('Profile', Dict),
+    ('Degraded', str),
+])
+
+class UnitGrapher:
+    """
+    UnitGrapher graphs the files of a single source unit. It holds the state
+    that is shared by all files of the unit; when graphing with --jobs, each
+    worker process has its own UnitGrapher.
+    """
+    def __init__(self, logger, args, u: Unit, prefixToDep: PathTrie, stdlib_modules: Set[str]) -> None:
+        self._logger = logger
+        self._args = args
+        self._unit = u
+        self._prefixToDep = prefixToDep
+        self._paths = PathContext(u.Dir, sys.path, prefixToDep, stdlib_modules)
+        self.resolutions = ResolutionCache()
+        self.symbols = None # type: SymbolIndexes
+        if args.symbol_index is not None:
+            self.symbols = SymbolIndexes(args.symbol_index, logger)
+        self.session = None # type: AnalysisSession
+        if args.jedi_session:
+            self.session = AnalysisSession(logger, args.session_max_rss * 1024 * 1024)
+
+    def graph_file(self, i: int, f: str) -> FileResult:
+        """ Graph the i-th file f. """
+        u = self._unit
+        self._logger.info('processing file: {} ({}/{})'.format(f, i, len(u.Files)))
+        profile = FileProfile(f) if self._args.profile_out is not None else NULL_PROFILE
+        result = None
+        degraded = None
+        try:
+            fg = FileGrapher(u.Dir, f, u.Name, u.Type, self._prefixToDep, sys.path, self._logger,
+                             resolution_cache=self.resolutions, path_context=self._paths,
+                             profile=profile, session=self.session,
+                             file_budget=self._args.file_timeout, ref_budget=self._args.ref_timeout,
+                             fast=self._args.fast, symbol_index=self.symbols)
+            defs, refs, docs = fg.graph()
+            degraded = fg.degraded
+            if degraded is not None:
+                self._logger.warning('degraded output for {}: {}'.format(f, degraded))
+                if self.session is not None:
+                    # Interrupted Jedi calls may have left incomplete results
+                    # in the session.
+                    self.session.reset()
+            self._logger.debug('resolution cache: {} hits, {} misses'.format(
+                self.resolutions.hits, self.resolutions.misses))
+            with profile.phase('encode'):
+                result = (toJSONable(list(defs.values())),
+                          refs.to_jsonable(),
+                          toJSONable(list(docs.values())))
+        except FileGrapherException as e:
+            self._logger.error('failed to graph {}: {}'.format(f, str(e)))
+        except Exception as e:
+            self._logger.error('failed to graph {} due to unanticipated error: {}'.format(f, str(e)))
+        finally:
+            if self.session is not None:
+                self.session.end_file()
+        record = profile.record()
+        if record is not None:
+            record['Degraded'] = degraded
+        return FileResult(result, record, degraded)
+
+# _worker_grapher is the UnitGrapher of a --jobs worker process.
+_worker_grapher = None # type: UnitGrapher
+
+def _init_worker(args, u: Unit, prefixToDep: PathTrie, stdlib_modules: Set[str]) -> None:
+    global _worker_grapher
+    _worker_grapher = UnitGrapher(setup_logger(args), args, u, prefixToDep, stdlib_modules)
+
+def _graph_file_in_worker(item: Tuple[int, str]) -> FileResult:
+    return _worker_grapher.graph_file(*item)
+
+# _stdlib_modules memoizes stdlib_module_paths by sys.path and working
+# directory, for processes that graph several units.
+_stdlib_modules = {} # type: Dict[Tuple[Tuple[str, ...], str], Set[str]]
+
+def cached_stdlib_module_paths() -> Set[str]:
+    """ Returns stdlib_module_paths(sys.path), computed once per sys.path and working directory. """
+    key = tuple(sys.path), os.getcwd()
+    try:
+        return _stdlib_modules[key]
+    except KeyError:
+        paths = _stdlib_modules[key] = stdlib_module_paths(sys.path)
+        return paths
+
+def graphunit(logger, args, u: Unit, out=None) -> None:
+    """ Write the graph of u to out (by default, stdout). """
+    if out is None:
+        out = sys.stdout
     if u.key() == BUILTIN_UNIT_KEY:
-        builtindefs = [b.to_def() for b in builtin.find_modules(u.Dir)]
+        builtindefs = [b.to_def() for b in builtin.find_modules(u.Dir, cpu_jobs(args.jobs), logger)]
         json.dump(toJSONable({
             'Defs': builtindefs,
             'Refs': [d.defref() for d in builtindefs],
             'Docs': [],
-        }), sys.stdout, sort_keys=True)
+        }), out, sort_keys=True)
         return
 
     if u.Dir is None or u.Dir == '':
         raise Exception('target directory must not be empty')
 
+    installs = InstallFingerprints(logger, args.install_fingerprints)
     if u.Type == UNIT_PIP:
         setupfile = os.path.join('.', u.Dir, 'setup.py')
         if os.path.lexists(setupfile):
-            pip.main(['install', '-q', '--upgrade', os.path.join('.', u.Dir)])
+            installs.install(['install', '-q', '--upgrade', os.path.join('.', u.Dir)], local_inputs(u.Dir))
 
     if u.Data and u.Data.ReqFiles:
         for reqfile in u.Data.ReqFiles:
             if os.path.lexists(reqfile):
-                pip.main(['install', '-q', '-r', reqfile])
+                installs.install(['install', '-q', '-r', reqfile], requirements_inputs(reqfile))
 
     prefixToDep = getModulePathPrefixToDep(u)
 
-    defs = {} # type: Dict[str, Def]
-    refs = {} # type: Dict[str, Ref]
-    docs = {} # type: Dict[str, Doc]
-
-    total = len(u.Files)
-    for i, f in enumerate(u.Files, start=1):
-        logger.info('processing file: {} ({}/{})'.format(f, i, total))
-        try:
-            fg = FileGrapher(u.Dir, f, u.Name, u.Type, prefixToDep, sys.path, logger)
-            defs_, refs_, docs_ = fg.graph()
-        except FileGrapherException as e:
-            logger.error('failed to graph {}: {}'.format(f, str(e)))
-            continue
-        except Exception as e:
-            logger.error('failed to graph {} due to unanticipated error: {}'.format(f, str(e)))
-            continue
-        # Note: This uses last version of def/ref, but since file order is random anyway,
-        #       it should be OK.
-        defs.update(defs_)
-        refs.update(refs_)
-        docs.update(docs_)
-
-    json.dump(toJSONable({
-        'Defs': [e for e in defs.values()],
-        'Refs': [e for e in refs.values()],
-        'Docs': [e for e in docs.values()],
-    }), sys.stdout, sort_keys=True)
+    items = list(enumerate(u.Files, start=1))
+
+    # Files whose graph is in the cache are replayed, and only the misses are
+    # graphed. Hits are loaded when their turn comes rather than up front, so
+    # that memory use stays flat.
+    cache = None
+    keys = {} # type: Dict[int, str]
+    misses = items
+    if args.cache_dir is not None:
+        cache = GraphCache(args.cache_dir, args.cache_size * 1024 * 1024, u, prefixToDep,
+                           {'fast': args.fast, 'jedi_session': args.jedi_session, 'symbol_index': args.symbol_index,
+                            'sys_path': sys.path, 'virtual_env': os.getenv('VIRTUAL_ENV')})
+        keys = {i: cache.key(f) for i, f in items}
+        misses = [(i, f) for i, f in items if not cache.contains(keys[i])]
+        logger.info('{}/{} files are cached'.format(len(items) - len(misses), len(items)))
+
+    # Files are graphed in worker processes when --jobs > 1, but results are
+    # always written in u.Files order so the output matches a serial run.
+    stdlib_modules = cached_stdlib_module_paths()
+    grapher = UnitGrapher(logger, args, u, prefixToDep, stdlib_modules)
+    jobs = cpu_jobs(args.jobs)
+    if jobs > 1:
+        logger.info('graphing {} files with {} jobs'.format(len(misses), jobs))
+        results = pool_imap(_graph_file_in_worker, misses, jobs,
+                            initializer=_init_worker, initargs=(args, u, prefixToDep, stdlib_modules))
+    else:
+        results = starmap(grapher.graph_file, misses)
+
+    profile_out = open(args.profile_out, 'w') if args.profile_out is not None else None
+    records = [] # type: List[Dict]
+    degraded = [] # type: List[str]
+    writer = GraphWriter(out)
+    missed = set(i for i, _ in misses)
+    for i, f in items:
+        record = None
+        if i in missed:
+            result, record, reason = next(results)
+            # Degraded graphs aren't cached, so that they are retried.
+            if cache is not None and result is not None and reason is None:
+                cache.put(keys[i], result)
+        else:
+            result = cache.get(keys[i])
+            reason = None
+            if result is None:
+                # The entry was evicted since we looked.
+                result, record, reason = grapher.graph_file(i, f)
+        if reason is not None:
+            degraded.append(f)
+        if result is not None:
+            writer.add(*result)
+        if profile_out is not None and record is not None:
+            profile_out.write(json.dumps(record, sort_keys=True) + '\n')
+            records.append(record)
+    writer.close()
+
+    if profile_out is not None:
+        profile_out.close()
+        logger.info(summarize(records))
+
+    if len(degraded) > 0:
+        logger.warning('{} files have degraded output because of time budgets: {}'.format(len(degraded), ', '.join(degraded)))
+    if jobs <= 1:
+        logger.info('resolution cache: {} hits, {} misses'.format(
+            grapher.resolutions.hits, grapher.resolutions.misses))
+    if cache is not None:
+        logger.info('graph cache: {} hits, {} entries evicted'.format(cache.hits, cache.evict()))
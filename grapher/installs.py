@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import os.path
+import sys
+import time
+
+import pip
+
+from typing import List, Dict
+
+from .cache import installed_versions
+from .fileindex import FileIndex
+from .reqcache import requirements_file_refs
+from .util import atomic_write
+
+# PACKAGING_FILES are the files besides Python sources that determine what
+# installing a local directory installs.
+PACKAGING_FILES = ['setup.cfg', 'MANIFEST.in', 'pyproject.toml']
+
+# MAX_FINGERPRINTS bounds the number of remembered installs; the oldest are
+# forgotten first.
+MAX_FINGERPRINTS = 1000
+
+class InstallFingerprints:
+    """
+    InstallFingerprints skips pip installs that are known to be satisfied.
+
+    The fingerprint of an install hashes the pip arguments, the paths and
+    contents of the files that determine what gets installed (see
+    local_inputs and requirements_inputs) and the target environment,
+    including the versions of the distributions installed in it, so that an
+    install is run again when another one changed what it installed.
+    Fingerprints of successful installs are recorded, with the environment
+    as they left it, in a JSON file, and an install whose fingerprint was
+    recorded before is not run again. The default file lives in the target
+    environment itself, so a fresh environment starts with no fingerprints.
+    """
+    def __init__(self, logger, path: str = None) -> None:
+        self._logger = logger
+        self._path = path if path is not None else default_path()
+        self._fingerprints = self._load()
+
+    def install(self, pip_args: List[str], inputs: List[str]) -> None:
+        """ Run `pip <pip_args>` unless an install with the same fingerprint succeeded before. """
+        inputs_digest = _inputs_digest(inputs)
+        if self._fingerprint(pip_args, inputs_digest) in self._fingerprints:
+            self._logger.info('skipping pip {}: already installed'.format(' '.join(pip_args)))
+            return
+        if pip.main(pip_args) != 0:
+            return
+        # The next run finds the environment as this install left it.
+        self._fingerprints[self._fingerprint(pip_args, inputs_digest)] = time.time()
+        self._save()
+
+    def _fingerprint(self, pip_args: List[str], inputs_digest: str) -> str:
+        h = hashlib.sha1()
+        h.update(json.dumps([
+            pip_args,
+            sys.prefix,
+            sys.version,
+            os.getenv('VIRTUAL_ENV'),
+            pip.__version__,
+            installed_versions(),
+            inputs_digest,
+        ]).encode('utf-8'))
+        return h.hexdigest()
+
+    def _load(self) -> Dict[str, float]:
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        # Merge with installs recorded concurrently by other processes.
+        fingerprints = self._load()
+        fingerprints.update(self._fingerprints)
+        if len(fingerprints) > MAX_FINGERPRINTS:
+            newest = sorted(fingerprints.items(), key=lambda e: e[1])[-MAX_FINGERPRINTS:]
+            fingerprints = dict(newest)
+        self._fingerprints = fingerprints
+        try:
+            with atomic_write(self._path) as f:
+                json.dump(fingerprints, f)
+        except OSError as e:
+            self._logger.warning('failed to record pip install fingerprints in {}: {}'.format(self._path, e))
+
+def _inputs_digest(inputs: List[str]) -> str:
+    """ Returns a digest of the paths and contents of the files inputs. """
+    h = hashlib.sha1()
+    for path in inputs:
+        h.update(b'\0' + path.encode('utf-8') + b'\0')
+        try:
+            with open(path, 'rb') as f:
+                h.update(hashlib.sha1(f.read()).digest())
+        except OSError:
+            h.update(b'<missing>')
+    return h.hexdigest()
+
+def default_path() -> str:
+    return os.path.join(sys.prefix, '.srclib-python-installs.json')
+
+def local_inputs(path: str) -> List[str]:
+    """
+    Returns the absolute paths of the files that determine what installing
+    the local directory or archive at path installs: the Python sources and
+    packaging files of a directory, or the archive itself.
+    """
+    path = os.path.abspath(path)
+    if not os.path.isdir(path):
+        return [path]
+    files = FileIndex(path).source_files(path) + [f for f in PACKAGING_FILES if os.path.exists(os.path.join(path, f))]
+    return [os.path.join(path, f) for f in sorted(files)]
+
+def requirements_inputs(reqfile: str) -> List[str]:
+    """
+    Returns the absolute paths of the files that determine what installing
+    the requirements file reqfile installs: itself, the requirements files
+    it includes and the inputs of the local paths it installs.
+    """
+    files, local = requirements_file_refs(reqfile)
+    inputs = [os.path.abspath(reqfile)] + files
+    for path in local:
+        inputs.extend(local_inputs(path))
+    return inputs
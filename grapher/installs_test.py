@@ -0,0 +1,80 @@
+import logging
+import os
+import os.path
+import tempfile
+import unittest
+
+from unittest import mock
+
+from grapher import installs
+from grapher.installs import InstallFingerprints, _inputs_digest, local_inputs, requirements_inputs
+
+class TestInstallFingerprints(unittest.TestCase):
+    """
+    Tests for the fingerprints of pip installs.
+    """
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.dir = d.name
+        self.installs = InstallFingerprints(logging.getLogger(__name__), os.path.join(self.dir, 'installs.json'))
+
+    def write(self, f, contents):
+        path = os.path.join(self.dir, f)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(contents)
+
+    def fingerprint(self, pip_args, inputs):
+        return self.installs._fingerprint(pip_args, _inputs_digest(inputs))
+
+    def test_self_install(self):
+        for proj in ['a', 'b']:
+            self.write(proj + '/setup.py', 'setup()')
+            self.write(proj + '/pkg/__init__.py', '')
+        args = ['install', '-q', '--upgrade', './.']
+        a = self.fingerprint(args, local_inputs(os.path.join(self.dir, 'a')))
+        # Other checkouts with the same setup.py are other installs, and so
+        # are source changes.
+        self.assertNotEqual(a, self.fingerprint(args, local_inputs(os.path.join(self.dir, 'b'))))
+        self.write('a/pkg/__init__.py', 'x = 1')
+        self.assertNotEqual(a, self.fingerprint(args, local_inputs(os.path.join(self.dir, 'a'))))
+
+    def test_requirements(self):
+        self.write('a/requirements.txt', '-r base.txt\n../lib\n')
+        self.write('a/base.txt', 'six\n')
+        self.write('lib/setup.py', 'setup()')
+        self.write('lib/lib.py', '')
+        reqfile = os.path.join(self.dir, 'a', 'requirements.txt')
+        self.assertEqual([reqfile, os.path.join(self.dir, 'a', 'base.txt'), os.path.join(self.dir, 'lib', 'lib.py'),
+                          os.path.join(self.dir, 'lib', 'setup.py')], requirements_inputs(reqfile))
+        args = ['install', '-q', '-r', reqfile]
+        before = self.fingerprint(args, requirements_inputs(reqfile))
+        self.write('lib/lib.py', 'x = 1')
+        self.assertNotEqual(before, self.fingerprint(args, requirements_inputs(reqfile)))
+
+    def test_install(self):
+        """ Check that successful installs are recorded and skipped, and failed ones are run again. """
+        self.write('requirements.txt', 'six\n')
+        args, inputs = ['install', '-r', 'requirements.txt'], [os.path.join(self.dir, 'requirements.txt')]
+        path = os.path.join(self.dir, 'installs.json')
+        versions = [['six==1.10.0']]
+        with mock.patch.object(installs.pip, 'main', return_value=1, create=True) as pip_main, \
+                mock.patch.object(installs, 'installed_versions', side_effect=lambda: versions[0]):
+            InstallFingerprints(logging.getLogger(__name__), path).install(args, inputs)
+            InstallFingerprints(logging.getLogger(__name__), path).install(args, inputs)
+            self.assertEqual(2, pip_main.call_count)
+            self.assertFalse(os.path.exists(path))
+
+            def install(pip_args):
+                versions[0] = ['six==1.11.0']
+                return 0
+            pip_main.side_effect = install
+            InstallFingerprints(logging.getLogger(__name__), path).install(args, inputs)
+            InstallFingerprints(logging.getLogger(__name__), path).install(args, inputs)
+            self.assertEqual(3, pip_main.call_count)
+
+            # Another install changed what this one installed.
+            versions[0] = ['six==1.9.0']
+            InstallFingerprints(logging.getLogger(__name__), path).install(args, inputs)
+            self.assertEqual(4, pip_main.call_count)
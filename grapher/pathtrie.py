@@ -0,0 +1,56 @@
+from typing import Any, List, Tuple
+
+from .util import normalize
+
+class PathTrie:
+    """
+    PathTrie maps paths to values and looks up the longest prefix of a path
+    that has a value. Paths are compared by whole '/'-separated components, so
+    'foo' is a prefix of 'foo/bar' but not of 'foobar'.
+    """
+    def __init__(self) -> None:
+        # Each node is a dict from path component to child node. A node that
+        # has a value stores (path, value) under the key None.
+        self._root = {} # type: dict
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def insert(self, path: str, value: Any) -> None:
+        node = self._root
+        for c in _components(path):
+            node = node.setdefault(c, {})
+        if None not in node:
+            self._len += 1
+        node[None] = (path, value)
+
+    def longest_prefix(self, path: str) -> Tuple[str, Any]:
+        """ Returns (prefix, value) for the longest prefix of path with a value, or None. """
+        node = self._root
+        found = node.get(None)
+        for c in _components(path):
+            node = node.get(c)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """ Returns the (path, value) pairs in the trie, sorted by path. """
+        items = [] # type: List[Tuple[str, Any]]
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            for c, child in node.items():
+                if c is None:
+                    items.append(child)
+                else:
+                    stack.append(child)
+        return sorted(items, key=lambda e: e[0])
+
+    def keys(self) -> List[str]:
+        return [path for path, _ in self.items()]
+
+def _components(path: str) -> List[str]:
+    return [c for c in normalize(path).split('/') if c != '']
@@ -0,0 +1,33 @@
+import unittest
+from grapher.pathtrie import PathTrie
+
+class TestPathTrie(unittest.TestCase):
+    """
+    Tests for PathTrie.
+    """
+    def test_longest_prefix(self):
+        """ Check that the longest matching prefix wins and that only whole components match. """
+        trie = PathTrie()
+        trie.insert('foo', 1)
+        trie.insert('foo/bar', 2)
+        trie.insert('/usr/lib/python3.5', 3)
+        cases = [
+            ('foo', ('foo', 1)),
+            ('foo/baz', ('foo', 1)),
+            ('foo/bar/baz', ('foo/bar', 2)),
+            ('foobar', None),
+            ('bar/foo', None),
+            ('/usr/lib/python3.5/os.py', ('/usr/lib/python3.5', 3)),
+            ('/usr/lib/python3.5-dbg/os.py', None),
+        ]
+        for path, exp in cases:
+            self.assertEqual(exp, trie.longest_prefix(path), msg=path)
+
+    def test_items(self):
+        """ Check that items are sorted by path and that reinserting replaces the value. """
+        trie = PathTrie()
+        trie.insert('b', 1)
+        trie.insert('a/c', 2)
+        trie.insert('b', 3)
+        self.assertEqual([('a/c', 2), ('b', 3)], trie.items())
+        self.assertEqual(2, len(trie))
@@ -0,0 +1,109 @@
+import time
+
+from contextlib import contextmanager
+from typing import List, Dict, Any
+
+class FileProfile:
+    """
+    FileProfile records where the time goes while graphing one file: the wall
+    time of each phase, counters such as the number of goto calls, and the
+    deepest goto chain followed.
+
+    Phases may nest (e.g., 'goto' runs inside 'refs'), so the phase times of a
+    file don't add up to its total. A phase that is re-entered recursively is
+    only timed at the outermost level.
+    """
+    def __init__(self, file: str) -> None:
+        self.file = file
+        self._start = time.perf_counter()
+        self._phases = {} # type: Dict[str, float]
+        self._active = {} # type: Dict[str, int]
+        self._counts = {} # type: Dict[str, int]
+        self._max_goto_depth = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        """ Time the enclosed block as part of phase name. """
+        depth = self._active.get(name, 0)
+        self._active[name] = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._active[name] = depth
+            if depth == 0:
+                self._phases[name] = self._phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, n: int = 1) -> None:
+        self._counts[name] = self._counts.get(name, 0) + n
+
+    def goto_depth(self, depth: int) -> None:
+        self._max_goto_depth = max(self._max_goto_depth, depth)
+
+    def record(self) -> Dict[str, Any]:
+        """ Returns the JSON-able profile record of the file. """
+        return {
+            'File': self.file,
+            'Total': time.perf_counter() - self._start,
+            'Phases': dict(self._phases),
+            'Counts': dict(self._counts),
+            'MaxGotoDepth': self._max_goto_depth,
+        }
+
+class _NullProfile:
+    """ _NullProfile is the profile used when profiling is disabled; it records nothing. """
+    file = None
+
+    def phase(self, name: str):
+        return _null_phase
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+    def goto_depth(self, depth: int) -> None:
+        pass
+
+    def record(self) -> Dict[str, Any]:
+        return None
+
+class _NullPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        return False
+
+_null_phase = _NullPhase()
+
+NULL_PROFILE = _NullProfile()
+
+def summarize(records: List[Dict[str, Any]], top: int = 10) -> str:
+    """ Returns a report of the slowest files and phases in records. """
+    lines = []
+    total = sum(r['Total'] for r in records)
+    lines.append('profiled {} files in {:.2f}s'.format(len(records), total))
+
+    phases = {} # type: Dict[str, float]
+    counts = {} # type: Dict[str, int]
+    for r in records:
+        for p, t in r['Phases'].items():
+            phases[p] = phases.get(p, 0.0) + t
+        for c, n in r['Counts'].items():
+            counts[c] = counts.get(c, 0) + n
+    lines.append('phases:')
+    for p, t in sorted(phases.items(), key=lambda e: (-e[1], e[0])):
+        lines.append('  {:<16} {:10.2f}s {:6.1f}%'.format(p, t, 100 * t / total if total > 0 else 0))
+    lines.append('counts:')
+    for c, n in sorted(counts.items()):
+        lines.append('  {:<16} {:10d}'.format(c, n))
+
+    lines.append('slowest files:')
+    for r in sorted(records, key=lambda r: -r['Total'])[:top]:
+        slowest = sorted(r['Phases'].items(), key=lambda e: -e[1])[:3]
+        lines.append('  {:10.2f}s {} ({}; max goto depth {})'.format(
+            r['Total'],
+            r['File'],
+            ', '.join('{} {:.2f}s'.format(p, t) for p, t in slowest),
+            r['MaxGotoDepth'],
+        ))
+    return '\n'.join(lines)
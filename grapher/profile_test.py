@@ -0,0 +1,28 @@
+import unittest
+from grapher.profile import FileProfile, NULL_PROFILE, summarize
+
+class TestFileProfile(unittest.TestCase):
+    """
+    Tests for FileProfile.
+    """
+    def test_record(self):
+        """ Check that recursive phases are timed once and counters accumulate. """
+        p = FileProfile('a.py')
+        with p.phase('refs'):
+            with p.phase('refs'):
+                pass
+        p.count('goto_calls')
+        p.count('goto_calls', 2)
+        p.goto_depth(3)
+        p.goto_depth(1)
+        r = p.record()
+        self.assertEqual('a.py', r['File'])
+        self.assertEqual(['refs'], list(r['Phases']))
+        self.assertEqual({'goto_calls': 3}, r['Counts'])
+        self.assertEqual(3, r['MaxGotoDepth'])
+        self.assertIn('a.py', summarize([r]))
+
+    def test_null_profile(self):
+        with NULL_PROFILE.phase('refs'):
+            NULL_PROFILE.count('goto_calls')
+        self.assertIsNone(NULL_PROFILE.record())
@@ -0,0 +1,87 @@
+"""
+Long-lived pydep helper, run by pydepwrap under Python 2 for setup.py files
+and packages that Python 3 can't parse.
+
+It reads one JSON request per line from stdin, {"id": ..., "cmd": "info" or
+"dep", "dir": ..., "resolve": ...}, where resolve tells dep whether to
+resolve the requirements, and writes one JSON response per line to stdout,
+{"id": ..., "result": ..., "error": ...}, where error is null on success.
+Setup scripts may print, so anything written to stdout while serving a
+request goes to stderr instead.
+
+This script must run under both Python 2 and 3, and can only import pydep.
+"""
+
+import json
+import os
+import sys
+import traceback
+
+import pydep.req
+import pydep.setup_py
+
+def info(diry, resolve):
+    """
+    Returns the setup info of diry as pydep-run.py info printed it, which
+    the fallback ran before this worker, so that scan output doesn't change.
+    """
+    setup_dict, err = pydep.setup_py.setup_info_dir(diry)
+    if err is not None:
+        raise Exception(err)
+    modules = []
+    if setup_dict.get('py_modules') is not None:
+        modules.extend(setup_dict['py_modules'])
+    if setup_dict.get('modules') is not None:
+        modules.extend(setup_dict['modules'])
+    return {
+        'rootdir': None,
+        'project_name': setup_dict.get('name'),
+        'version': setup_dict.get('version'),
+        'repo_url': setup_dict.get('url'),
+        'packages': setup_dict.get('packages'),
+        'modules': modules or None,
+        'scripts': setup_dict.get('scripts'),
+        'author': setup_dict.get('author'),
+        'description': setup_dict.get('description'),
+    }
+
+def dep(diry, resolve):
+    reqs, err = pydep.req.requirements(diry, resolve)
+    if err is not None:
+        raise Exception(err)
+    return reqs
+
+COMMANDS = {'info': info, 'dep': dep}
+
+def serve(requests, out):
+    for line in requests:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        cwd, path, modules = os.getcwd(), list(sys.path), set(sys.modules)
+        response = {'id': request.get('id'), 'result': None, 'error': None}
+        try:
+            response['result'] = COMMANDS[request['cmd']](request['dir'], request.get('resolve', True))
+        except (Exception, SystemExit) as e:
+            traceback.print_exc()
+            response['error'] = '{}: {}'.format(type(e).__name__, e)
+        finally:
+            # Setup scripts can change the working directory and import
+            # their own packages; don't let that leak into the next request.
+            os.chdir(cwd)
+            sys.path[:] = path
+            for m in set(sys.modules) - modules:
+                del sys.modules[m]
+        out.write(json.dumps(response) + '\n')
+        out.flush()
+
+def main():
+    # Keep the real stdout for responses, and send everything else that is
+    # written to it, including by subprocesses, to stderr.
+    out = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    serve(iter(sys.stdin.readline, ''), out)
+
+if __name__ == '__main__':
+    main()
@@ -2,11 +2,14 @@
 
 """
 
+import atexit
 import subprocess
 import sys
 import os
 import os.path
 import json
+import selectors
+import time
 
 import pydep.setup_py
 import pydep.req
@@ -14,20 +17,121 @@ import pydep.req
 from typing import Any, List, Dict
 from operator import itemgetter
 
+from .reqcache import RequirementCache, unresolved
+
 def setup_dirs(rootdir: str) -> List[str]:
     return pydep.setup_py.setup_dirs(rootdir)
 
+# PYTHON2_TIMEOUT is how many seconds a pydep command may take under Python 2.
+# Resolving requirements can download packages.
+PYTHON2_TIMEOUT = 600
+
+class PydepWorker:
+    """
+    PydepWorker runs pydep_worker.py under python and sends it commands. The
+    worker is started on the first command and kept running across commands,
+    so that the interpreter and setuptools are only loaded once. A worker that
+    dies is restarted and the command retried once; one that doesn't answer
+    within the timeout is killed, and restarted on the next command.
+    """
+    def __init__(self, python: str, timeout: float = PYTHON2_TIMEOUT) -> None:
+        self._args = [python, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pydep_worker.py')]
+        self._timeout = timeout
+        self._process = None # type: subprocess.Popen
+        self._pid = None # type: int
+        self._buf = b''
+        self._next_id = 0
+        self.starts = 0
+
+    def call(self, cmd: str, dir: str, resolve: bool = True) -> Any:
+        """ Run pydep command cmd ('info' or 'dep', which resolves requirements if resolve is set) on dir and return its result. """
+        try:
+            return self._call(cmd, dir, resolve)
+        except (BrokenPipeError, EOFError):
+            self.close()
+        return self._call(cmd, dir, resolve)
+
+    def _call(self, cmd: str, dir: str, resolve: bool) -> Any:
+        # A worker started before a fork belongs to the parent process.
+        if self._process is None or self._pid != os.getpid():
+            self._start()
+        self._next_id += 1
+        self._process.stdin.write(json.dumps({'id': self._next_id, 'cmd': cmd, 'dir': dir, 'resolve': resolve}).encode('utf-8') + b'\n')
+        self._process.stdin.flush()
+        try:
+            line = self._readline(time.monotonic() + self._timeout)
+        except TimeoutError:
+            self.close()
+            raise Exception('pydep {} {} timed out after {}s under Python 2'.format(cmd, dir, self._timeout)) from None
+        response = json.loads(line.decode('utf-8'))
+        if response['id'] != self._next_id:
+            self.close()
+            raise Exception('pydep worker answered request {} instead of {}'.format(response['id'], self._next_id))
+        if response['error'] is not None:
+            raise Exception(response['error'])
+        return response['result']
+
+    def _start(self) -> None:
+        self._process = subprocess.Popen(self._args, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._pid = os.getpid()
+        self._buf = b''
+        self.starts += 1
+
+    def _readline(self, deadline: float) -> bytes:
+        """ Read a line from the worker. Raises EOFError if it exited and TimeoutError at deadline. """
+        fd = self._process.stdout.fileno()
+        with selectors.DefaultSelector() as sel:
+            sel.register(fd, selectors.EVENT_READ)
+            while b'\n' not in self._buf:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not sel.select(remaining):
+                    raise TimeoutError()
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise EOFError('pydep worker exited with status {}'.format(self._process.wait()))
+                self._buf += chunk
+        line, self._buf = self._buf.split(b'\n', 1)
+        return line
+
+    def close(self) -> None:
+        """ Stop the worker, if it is running and ours. """
+        if self._process is not None and self._pid == os.getpid():
+            # An idle worker exits at the end of its input; a busy one is killed.
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+            try:
+                self._process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process.stdout.close()
+        self._process = None
+
+_python2_worker = None # type: PydepWorker
+
 # pydep_in_python2 uses Python2 to run pydep and returns parsed JSON object.
-def pydep_in_python2(cmd: str, dir: str) -> Any:
-    rootdir = os.environ.get('SRCLIBPY_ROOTDIR')
-    pydep = os.path.join(rootdir, ".env", "bin", "pydep-run.py")
-    python = os.path.join(rootdir, ".env", "bin", "python2.7")
-    process = subprocess.Popen([python, pydep, cmd, dir], stdout=subprocess.PIPE)
-    out, err = process.communicate()
-    if err is not None:
-        raise Exception(err)
-    data = json.loads(out.decode('utf-8'))
-    return data
+def pydep_in_python2(cmd: str, dir: str, resolve: bool = True) -> Any:
+    global _python2_worker
+    if _python2_worker is None:
+        rootdir = os.environ.get('SRCLIBPY_ROOTDIR')
+        _python2_worker = PydepWorker(os.path.join(rootdir, ".env", "bin", "python2.7"))
+        atexit.register(_python2_worker.close)
+    return _python2_worker.call(cmd, dir, resolve)
+
+_requirement_cache = None # type: RequirementCache
+
+def configure_requirement_cache(cache_dir: str = None, offline: bool = False, wheelhouse: str = None) -> None:
+    """
+    Resolve requirements through a RequirementCache in cache_dir (see there
+    for offline and wheelhouse). Without a cache_dir and not offline, every
+    requirement is resolved by pydep.
+    """
+    global _requirement_cache
+    _requirement_cache = None
+    if cache_dir is not None or offline:
+        _requirement_cache = RequirementCache(cache_dir, offline, wheelhouse)
 
 def setup_info_dir(setup_dir: str) -> Any:
     try:
@@ -40,28 +144,90 @@ def setup_info_dir(setup_dir: str) -> Any:
     else:
         raise
 
-def requirements_from_requirements_txt(diry: str) -> List[Dict[str, Any]]:
+def requirements_from_requirements_txt(diry: str, specs: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Returns the resolved requirements in the requirements.txt file of diry.
+    specs, if given, are its unresolved requirements, as for requirements.
+    """
+    cached = _cached_requirements(specs)
+    if cached is not None:
+        return cached
     reqs, err = pydep.req.requirements_from_requirements_txt(diry)
     if err is not None:
         raise Exception(err)
+    resolved = []
     for r in reqs:
-        if r.to_dict()['project_name'] == 'wsgiref':
+        req = r.to_dict()
+        if req['project_name'] == 'wsgiref':
             # Kludge: wsgiref's setup.py messes with sys.stdout, so should not be resolved
+            resolved.append(req)
             continue
-        try:
-            r.resolve()
-        except:
-            sys.stderr.write('failed to resolve requirement {}\n'.format(r))
-    return sorted([r.to_dict() for r in reqs], key=itemgetter('key'))
+        resolved.append(_resolve_requirement(r, req))
+    return sorted(resolved, key=itemgetter('key'))
+
+def _resolve_requirement(r, req: Dict[str, Any]) -> Dict[str, Any]:
+    """ Resolve the pydep requirement r, whose unresolved dict is req, through the requirement cache. """
+    cache = _requirement_cache
+    if cache is not None:
+        cached = cache.get(req)
+        if cached is not None:
+            return cached
+        if cache.offline:
+            return req
+    try:
+        r.resolve()
+    except:
+        sys.stderr.write('failed to resolve requirement {}\n'.format(r))
+        return r.to_dict()
+    resolved = r.to_dict()
+    if cache is not None and resolved.get('resolved') is not False:
+        cache.put(req, resolved)
+    return resolved
+
+def requirements(pkgdir: str, resolve: bool, specs: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Returns the requirements of the package in pkgdir, resolved if resolve is
+    set. specs, if given, are its unresolved requirements (see
+    reqcache.unresolved), e.g. as a previous scan found them; when they are
+    all in the requirement cache, setup.py isn't run at all.
+    """
+    cache = _requirement_cache
+    if not resolve or cache is None:
+        return _requirements(pkgdir, resolve)
+    if specs is None and cache.offline:
+        specs = _requirements(pkgdir, False)
+    cached = _cached_requirements(specs)
+    if cached is not None:
+        return cached
+    # pydep resolves all requirements of a directory at once, running setup.py
+    # once; the cache keys are the unresolved specs of what it returns.
+    resolved = _requirements(pkgdir, True)
+    for r in resolved:
+        if r.get('resolved') is not False:
+            cache.put(unresolved(r), r)
+    return resolved
+
+def _cached_requirements(specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Returns the requirements specs resolved from the requirement cache, or
+    None if any of them misses. Offline, misses stay unresolved.
+    """
+    cache = _requirement_cache
+    if specs is None or cache is None:
+        return None
+    cached = [cache.get(req) for req in specs]
+    if not cache.offline and any(c is None for c in cached):
+        return None
+    return [c if c is not None else req for req, c in zip(specs, cached)]
 
-def requirements(pkgdir: str, resolve: bool) -> List[Dict[str, Any]]:
+def _requirements(pkgdir: str, resolve: bool) -> List[Dict[str, Any]]:
     try:
         pkgreqs, err = pydep.req.requirements(pkgdir, resolve)
         if err is not None:
             raise Exception(err)
         return sorted(pkgreqs, key=itemgetter('key'))
     except SyntaxError as e:
-        pkgreqs = pydep_in_python2("dep", pkgdir)
+        pkgreqs = pydep_in_python2("dep", pkgdir, resolve)
         return sorted(pkgreqs, key=itemgetter('key'))
     else:
         raise
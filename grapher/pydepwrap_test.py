@@ -0,0 +1,89 @@
+import os
+import os.path
+import sys
+import tempfile
+import time
+import unittest
+
+try:
+    from grapher.pydepwrap import PydepWorker
+except ImportError:
+    PydepWorker = None
+
+# FAKE_WORKER speaks the pydep_worker.py protocol. Its commands answer with
+# the worker's pid, or with dir for echo; die exits without answering unless
+# the file dir exists, which it creates; and hang never answers.
+FAKE_WORKER = '''
+import json, os, sys, time
+for line in iter(sys.stdin.readline, ''):
+    request = json.loads(line)
+    cmd, diry = request['cmd'], request['dir']
+    if cmd == 'die' and not os.path.exists(diry):
+        open(diry, 'w').close()
+        sys.exit(1)
+    if cmd == 'hang':
+        time.sleep(60)
+    if cmd == 'fail':
+        response = {'id': request['id'], 'result': None, 'error': 'Exception: failed'}
+    else:
+        response = {'id': request['id'], 'result': diry if cmd == 'echo' else os.getpid(), 'error': None}
+    sys.stdout.write(json.dumps(response) + '\\n')
+    sys.stdout.flush()
+'''
+
+@unittest.skipIf(PydepWorker is None, 'needs pydep')
+class TestPydepWorker(unittest.TestCase):
+    """
+    Tests for PydepWorker, driving a fake worker script.
+    """
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.dir = d.name
+        script = os.path.join(self.dir, 'fake_worker.py')
+        with open(script, 'w') as fp:
+            fp.write(FAKE_WORKER)
+        self.worker = PydepWorker(sys.executable, timeout=1)
+        self.worker._args = [sys.executable, script]
+        self.addCleanup(self.worker.close)
+
+    def test_call(self):
+        self.assertEqual('a', self.worker.call('echo', 'a'))
+        pid = self.worker.call('pid', '')
+        self.assertEqual(pid, self.worker.call('pid', ''))
+        with self.assertRaises(Exception):
+            self.worker.call('fail', '')
+        # Errors don't stop the worker.
+        self.assertEqual(pid, self.worker.call('pid', ''))
+        self.assertEqual(1, self.worker.starts)
+
+    def test_restart(self):
+        """ Check that a worker that dies is restarted and the command retried once. """
+        pid = self.worker.call('pid', '')
+        restarted = self.worker.call('die', os.path.join(self.dir, 'died'))
+        self.assertNotEqual(pid, restarted)
+        self.assertEqual(restarted, self.worker.call('pid', ''))
+        self.assertEqual(2, self.worker.starts)
+
+    def test_timeout(self):
+        """ Check that a worker that doesn't answer is killed, and restarted on the next command. """
+        start = time.monotonic()
+        with self.assertRaises(Exception):
+            self.worker.call('hang', '')
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual('a', self.worker.call('echo', 'a'))
+        self.assertEqual(2, self.worker.starts)
+
+    def test_fork(self):
+        """ Check that a forked child starts its own worker rather than using its parent's. """
+        pid = self.worker.call('pid', '')
+        child = os.fork()
+        if child == 0:
+            ok = False
+            try:
+                ok = self.worker.call('pid', '') != pid and self.worker.starts == 2
+            finally:
+                os._exit(0 if ok else 1)
+        _, status = os.waitpid(child, 0)
+        self.assertEqual(0, status)
+        self.assertEqual(pid, self.worker.call('pid', ''))
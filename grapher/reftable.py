@@ -0,0 +1,79 @@
+from array import array
+from typing import List, Dict, Set
+
+class RefTable:
+    """
+    RefTable stores the refs of a file in columns instead of as Ref objects.
+
+    Strings are interned into a per-table list and stored as indexes into it,
+    offsets and flags are stored in typed arrays. A ref is identified by its
+    (DefPath, File, Start, End), packed into a single int; adding a ref whose
+    key is already present keeps the first one and stores nothing.
+    """
+    def __init__(self) -> None:
+        self._strings = [] # type: List[str]
+        self._string_ids = {} # type: Dict[str, int]
+        self._keys = set() # type: Set[int]
+        self._def_repo = array('i')
+        self._def_unit = array('i')
+        self._def_unit_type = array('i')
+        self._def_path = array('i')
+        self._unit = array('i')
+        self._unit_type = array('i')
+        self._file = array('i')
+        self._start = array('q')
+        self._end = array('q')
+        self._def = array('b')
+        self._to_builtin = array('b')
+
+    def __len__(self) -> int:
+        return len(self._start)
+
+    def add(self, DefRepo: str, DefUnit: str, DefUnitType: str, DefPath: str, Def: bool,
+            Unit: str, UnitType: str, File: str, Start: int, End: int, ToBuiltin: bool) -> bool:
+        """ Add a ref, unless one with the same key exists. Returns whether it was added. """
+        def_path, file = self._intern(DefPath), self._intern(File)
+        key = (((def_path << 32 | file) << 40 | Start) << 40) | End
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        self._def_repo.append(self._intern(DefRepo))
+        self._def_unit.append(self._intern(DefUnit))
+        self._def_unit_type.append(self._intern(DefUnitType))
+        self._def_path.append(def_path)
+        self._unit.append(self._intern(Unit))
+        self._unit_type.append(self._intern(UnitType))
+        self._file.append(file)
+        self._start.append(Start)
+        self._end.append(End)
+        self._def.append(Def)
+        self._to_builtin.append(ToBuiltin)
+        return True
+
+    def to_jsonable(self) -> List[Dict]:
+        """ Returns the refs in the order they were added, as toJSONable returns Ref objects. """
+        s = self._strings
+        return [{
+            'DefRepo': s[def_repo],
+            'DefUnit': s[def_unit],
+            'DefUnitType': s[def_unit_type],
+            'DefPath': s[def_path],
+            'Def': bool(def_),
+            'Unit': s[unit],
+            'UnitType': s[unit_type],
+            'File': s[file],
+            'Start': start,
+            'End': end,
+            'ToBuiltin': bool(to_builtin),
+        } for def_repo, def_unit, def_unit_type, def_path, def_, unit, unit_type, file, start, end, to_builtin in zip(
+            self._def_repo, self._def_unit, self._def_unit_type, self._def_path, self._def,
+            self._unit, self._unit_type, self._file, self._start, self._end, self._to_builtin,
+        )]
+
+    def _intern(self, v: str) -> int:
+        i = self._string_ids.get(v)
+        if i is None:
+            i = len(self._strings)
+            self._strings.append(v)
+            self._string_ids[v] = i
+        return i
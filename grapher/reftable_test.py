@@ -0,0 +1,23 @@
+import unittest
+from grapher.reftable import RefTable
+from grapher.structures import Ref, toJSONable
+
+class TestRefTable(unittest.TestCase):
+    """
+    Tests for RefTable.
+    """
+    def test_to_jsonable(self):
+        """ Check that refs are deduplicated, keep their order and serialize like Ref objects. """
+        refs = [
+            Ref(DefRepo='', DefUnit='u', DefUnitType='t', DefPath='a', Def=True, Unit='u', UnitType='t',
+                File='f.py', Start=0, End=1, ToBuiltin=False),
+            Ref(DefRepo='r', DefUnit='v', DefUnitType='t', DefPath='b', Def=False, Unit='u', UnitType='t',
+                File='f.py', Start=4, End=5, ToBuiltin=True),
+            Ref(DefRepo='', DefUnit='u', DefUnitType='t', DefPath='a', Def=False, Unit='u', UnitType='t',
+                File='f.py', Start=0, End=1, ToBuiltin=True),
+        ]
+        table = RefTable()
+        added = [table.add(**toJSONable(r)) for r in refs]
+        self.assertEqual([True, True, False], added)
+        self.assertEqual(2, len(table))
+        self.assertEqual(toJSONable(refs[:2]), table.to_jsonable())
@@ -0,0 +1,204 @@
+import glob
+import hashlib
+import json
+import os
+import os.path
+import re
+import time
+import zipfile
+
+from typing import Any, List, Dict, Tuple
+
+import pkg_resources
+
+from .util import atomic_write
+
+# UNPINNED_MAX_AGE is how many seconds a resolved requirement that isn't
+# pinned to a version is served from the cache, as a new release may change
+# what it provides. Pinned requirements don't expire.
+UNPINNED_MAX_AGE = 24 * 60 * 60
+
+# DEFAULT_INDEX_URL is the package index pip uses when none is configured.
+DEFAULT_INDEX_URL = 'https://pypi.python.org/simple'
+
+class RequirementCache:
+    """
+    RequirementCache is a persistent cache of resolved requirements, so that
+    scans don't download and inspect the same distributions again.
+
+    Entries map a requirement, as the pydep requirement dict of its
+    unresolved spec (project name, version specifiers, extras, URL; see
+    unresolved), and the package index URL to the resolved requirement
+    dict. Without a cache_dir, nothing is cached.
+
+    In offline mode, requirements are only resolved from the cache, where
+    they don't expire, or from the wheels in the wheelhouse directory; the
+    rest stay unresolved.
+    """
+    def __init__(self, cache_dir: str = None, offline: bool = False, wheelhouse: str = None,
+                 index_url: str = None, max_age: float = UNPINNED_MAX_AGE) -> None:
+        self._dir = cache_dir
+        self.offline = offline
+        self._wheelhouse = wheelhouse
+        self._index_url = index_url or os.getenv('PIP_INDEX_URL') or DEFAULT_INDEX_URL
+        self._max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        """ Returns the unresolved requirement req resolved from the cache or, in offline mode, the wheelhouse, or None. """
+        resolved = self._get_cached(req)
+        if resolved is None and self.offline and self._wheelhouse is not None:
+            resolved = resolve_from_wheelhouse(req, self._wheelhouse)
+            if resolved is not None:
+                self.put(req, resolved)
+        if resolved is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return resolved
+
+    def put(self, req: Dict[str, Any], resolved: Dict[str, Any]) -> None:
+        """ Record that the unresolved requirement req resolves to resolved. """
+        if self._dir is None:
+            return
+        with atomic_write(self._path(req)) as fp:
+            json.dump(resolved, fp, sort_keys=True)
+
+    def _get_cached(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        if self._dir is None:
+            return None
+        path = self._path(req)
+        try:
+            if not self.offline and not is_pinned(req) and time.time() - os.stat(path).st_mtime > self._max_age:
+                return None
+            with open(path, encoding='utf-8') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    def _path(self, req: Dict[str, Any]) -> str:
+        key = hashlib.sha1(json.dumps([unresolved(req), self._index_url], sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self._dir, key[:2], key + '.json')
+
+def unresolved(req: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the unresolved spec of a pydep requirement dict, resolved or not:
+    req without what resolving it fills in.
+    """
+    spec = dict(req)
+    spec.update(packages=None, modules=None, repo_url=None)
+    if 'resolved' in spec:
+        spec['resolved'] = False
+    return spec
+
+# REQUIREMENTS_FILE_OPTIONS are the options of a requirements file line that
+# name another requirements or constraints file.
+REQUIREMENTS_FILE_OPTIONS = ('-r', '-c', '--requirement', '--constraint')
+
+def requirements_file_refs(path: str) -> Tuple[List[str], List[str]]:
+    """
+    Returns what the requirements file at path pulls in, recursively: the
+    requirements and constraints files it includes (-r, -c), and the local
+    directories and archives it installs (e.g. `../pkg` or `-e .`). Relative
+    paths are resolved against the directory of the file that names them,
+    like pip does. Files that can't be read are left out.
+    """
+    files, local = [], [] # type: List[str], List[str]
+    todo = [os.path.abspath(path)]
+    seen = set(todo)
+    while todo:
+        req_file = todo.pop()
+        try:
+            with open(req_file, encoding='utf-8', errors='replace') as fp:
+                lines = fp.read().splitlines()
+        except OSError:
+            continue
+        diry = os.path.dirname(req_file)
+        for line in lines:
+            args = line.split(' #', 1)[0].split()
+            if len(args) == 0 or args[0].startswith('#'):
+                continue
+            opt, _, value = args[0].partition('=')
+            if opt in REQUIREMENTS_FILE_OPTIONS or opt in ('-e', '--editable'):
+                if value == '' and len(args) > 1:
+                    value = args[1]
+            elif args[0][:2] in ('-r', '-c', '-e'):
+                opt, value = args[0][:2], args[0][2:]
+            else:
+                opt, value = None, args[0]
+            if value.startswith('file:'):
+                value = value[len('file:'):]
+            if opt in REQUIREMENTS_FILE_OPTIONS:
+                ref = os.path.normpath(os.path.join(diry, value))
+                if ref not in seen:
+                    seen.add(ref)
+                    files.append(ref)
+                    todo.append(ref)
+            elif opt in (None, '-e', '--editable') and (value.startswith('.') or os.path.isabs(value)):
+                local.append(os.path.normpath(os.path.join(diry, value)))
+    return files, local
+
+def is_pinned(req: Dict[str, Any]) -> bool:
+    """ Reports whether req asks for an exact version, which ==X.* doesn't. """
+    return any(op == '===' or (op == '==' and not v.endswith('.*')) for op, v in req.get('specs') or [])
+
+def resolve_from_wheelhouse(req: Dict[str, Any], wheelhouse: str) -> Dict[str, Any]:
+    """
+    Resolves req from the best matching wheel in the wheelhouse directory: the
+    newest one that satisfies its version specifiers. Returns None if there is
+    none. Source distributions are not inspected, as that means running their
+    setup.py.
+    """
+    name = req.get('key') or req.get('project_name')
+    if name is None:
+        return None
+    specs = req.get('specs') or []
+    candidates = [] # type: List[Tuple[Any, str]]
+    for path in glob.glob(os.path.join(wheelhouse, '*.whl')):
+        parts = os.path.basename(path).split('-')
+        if len(parts) < 5 or _canonical_name(parts[0]) != _canonical_name(name):
+            continue
+        if _satisfies(parts[1], specs):
+            candidates.append((pkg_resources.parse_version(parts[1]), path))
+    if len(candidates) == 0:
+        return None
+    packages, modules, repo_url = wheel_contents(max(candidates)[1])
+    resolved = dict(req)
+    resolved.update({'packages': packages, 'modules': modules, 'repo_url': repo_url})
+    if 'resolved' in req:
+        resolved['resolved'] = True
+    return resolved
+
+def wheel_contents(path: str) -> Tuple[List[str], List[str], str]:
+    """ Returns the packages, the top-level modules and the home page of a wheel. """
+    packages, modules = set(), set()
+    repo_url = None
+    with zipfile.ZipFile(path) as whl:
+        for name in whl.namelist():
+            top = name.split('/', 1)[0]
+            if top.endswith('.dist-info') or top.endswith('.data'):
+                if name.endswith('.dist-info/METADATA'):
+                    for line in whl.read(name).decode('utf-8', 'replace').splitlines():
+                        if line.startswith('Home-page:'):
+                            repo_url = line.split(':', 1)[1].strip()
+                        elif line == '':
+                            break
+                continue
+            head, _, base = name.rpartition('/')
+            if base == '__init__.py':
+                packages.add(head.replace('/', '.'))
+            elif head == '' and base.endswith('.py'):
+                modules.add(base[:-len('.py')])
+    return sorted(packages), sorted(modules), repo_url
+
+def _canonical_name(name: str) -> str:
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def _satisfies(version: str, specs: List[Tuple[str, str]]) -> bool:
+    """ Reports whether version satisfies all the version specifiers specs, prereleases included. """
+    try:
+        req = pkg_resources.Requirement.parse('x' + ','.join(op + v for op, v in specs))
+    except ValueError:
+        return False
+    return version in req
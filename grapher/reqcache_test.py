@@ -0,0 +1,122 @@
+import os
+import os.path
+import tempfile
+import time
+import unittest
+import zipfile
+
+from grapher.reqcache import (RequirementCache, _satisfies, is_pinned, requirements_file_refs, resolve_from_wheelhouse,
+                              unresolved)
+
+def _req(name, specs=None):
+    return {'key': name, 'project_name': name, 'specs': specs or [], 'packages': None, 'modules': None,
+            'repo_url': None, 'resolved': False}
+
+def _resolved(req, packages):
+    r = dict(req)
+    r.update(packages=packages, resolved=True)
+    return r
+
+class TestRequirementCache(unittest.TestCase):
+    """
+    Tests for RequirementCache.
+    """
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_get_put(self):
+        cache = RequirementCache(self.dir.name)
+        req = _req('six', [['==', '1.10.0']])
+        self.assertIsNone(cache.get(req))
+        cache.put(req, _resolved(req, ['six']))
+        self.assertEqual(_resolved(req, ['six']), cache.get(req))
+        # Other specs and other indexes are other entries.
+        self.assertIsNone(cache.get(_req('six', [['==', '1.9.0']])))
+        self.assertIsNone(RequirementCache(self.dir.name, index_url='http://mirror/simple').get(req))
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+        # Entries are keyed on the unresolved spec, which can be derived from
+        # the resolved requirement.
+        req = _req('requests')
+        cache.put(unresolved(_resolved(req, ['requests'])), _resolved(req, ['requests']))
+        self.assertEqual(req, unresolved(_resolved(req, ['requests'])))
+        self.assertEqual(_resolved(req, ['requests']), cache.get(req))
+
+    def test_unpinned_expire(self):
+        cache = RequirementCache(self.dir.name, max_age=60)
+        pinned, unpinned = _req('six', [['==', '1.10.0']]), _req('requests', [['>=', '2.0']])
+        cache.put(pinned, _resolved(pinned, ['six']))
+        cache.put(unpinned, _resolved(unpinned, ['requests']))
+        old = time.time() - 120
+        for dirpath, _, filenames in os.walk(self.dir.name):
+            for f in filenames:
+                os.utime(os.path.join(dirpath, f), (old, old))
+        self.assertIsNotNone(cache.get(pinned))
+        self.assertIsNone(cache.get(unpinned))
+        # Offline, expired entries are better than none.
+        self.assertIsNotNone(RequirementCache(self.dir.name, offline=True, max_age=60).get(unpinned))
+
+    def test_wheelhouse(self):
+        for version in ['1.0', '2.0', '3.0']:
+            path = os.path.join(self.dir.name, 'my_pkg-{}-py2.py3-none-any.whl'.format(version))
+            with zipfile.ZipFile(path, 'w') as whl:
+                whl.writestr('my_pkg/__init__.py', '')
+                whl.writestr('my_pkg/sub/__init__.py', '')
+                whl.writestr('my_pkg/sub/mod.py', '')
+                whl.writestr('helper.py', '')
+                whl.writestr('my_pkg-{}.dist-info/METADATA'.format(version),
+                             'Name: my-pkg\nHome-page: https://github.com/x/my-pkg\n\nHome-page: not this\n')
+        resolved = resolve_from_wheelhouse(_req('my-pkg', [['<', '3.0']]), self.dir.name)
+        self.assertEqual(['my_pkg', 'my_pkg.sub'], resolved['packages'])
+        self.assertEqual(['helper'], resolved['modules'])
+        self.assertEqual('https://github.com/x/my-pkg', resolved['repo_url'])
+        self.assertTrue(resolved['resolved'])
+        self.assertIsNone(resolve_from_wheelhouse(_req('my-pkg', [['>', '3.0']]), self.dir.name))
+        self.assertIsNotNone(resolve_from_wheelhouse(_req('my-pkg', [['==', '2.*']]), self.dir.name))
+        self.assertIsNone(resolve_from_wheelhouse(_req('my-pkg', [['==', '4.*']]), self.dir.name))
+        self.assertIsNone(resolve_from_wheelhouse(_req('other'), self.dir.name))
+
+        # Offline, the wheelhouse is used when the cache misses.
+        cache = RequirementCache(os.path.join(self.dir.name, 'cache'), offline=True, wheelhouse=self.dir.name)
+        self.assertEqual(['my_pkg', 'my_pkg.sub'], cache.get(_req('my_pkg'))['packages'])
+        self.assertIsNone(cache.get(_req('other')))
+
+    def test_requirements_file_refs(self):
+        files = {
+            'requirements.txt': '-r base.txt\n--constraint=sub/constraints.txt\nsix==1.10.0  # pinned\n-e .\n../pkg\n'
+                                '-e git+https://github.com/x/y#egg=y\n',
+            'base.txt': '-rsub/more.txt\n-r requirements.txt\n',
+            'sub/constraints.txt': 'six<2\n',
+            'sub/more.txt': '--requirement ../missing.txt\nfile:../wheels/z.whl\n',
+        }
+        for f, contents in files.items():
+            path = os.path.join(self.dir.name, 'repo', f)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as fp:
+                fp.write(contents)
+        repo = os.path.join(self.dir.name, 'repo')
+        refs, local = requirements_file_refs(os.path.join(repo, 'requirements.txt'))
+        self.assertEqual(sorted(os.path.join(repo, f) for f in ['base.txt', 'sub/constraints.txt', 'sub/more.txt', 'missing.txt']),
+                         sorted(refs))
+        self.assertEqual(sorted([repo, os.path.join(self.dir.name, 'pkg'), os.path.join(self.dir.name, 'repo', 'wheels', 'z.whl')]),
+                         sorted(local))
+
+class TestSpecs(unittest.TestCase):
+    """
+    Tests for matching version specifiers.
+    """
+    def test_satisfies(self):
+        self.assertTrue(_satisfies('1.10.2', [['==', '1.10.*']]))
+        self.assertFalse(_satisfies('1.1', [['==', '1.10.*']]))
+        self.assertFalse(_satisfies('1.10.2', [['!=', '1.10.*']]))
+        self.assertTrue(_satisfies('1.11', [['!=', '1.10.*'], ['>=', '1.0']]))
+        self.assertTrue(_satisfies('1.4.5', [['~=', '1.4.2']]))
+        self.assertFalse(_satisfies('1.5', [['~=', '1.4.2']]))
+        self.assertTrue(_satisfies('2.0', []))
+
+    def test_is_pinned(self):
+        self.assertTrue(is_pinned(_req('a', [['==', '1.0']])))
+        self.assertTrue(is_pinned(_req('a', [['===', '1.0']])))
+        self.assertFalse(is_pinned(_req('a', [['==', '1.*']])))
+        self.assertFalse(is_pinned(_req('a', [['>=', '1.0']])))
+        self.assertFalse(is_pinned(_req('a')))
@@ -3,11 +3,16 @@ import os
 import os.path
 import json
 
+from functools import partial
+
 from . import pydepwrap
 from . import django
 from . import builtin
 from .structures import *
-from .util import normalize
+from .util import normalize, pool_imap, cpu_jobs
+from .fileindex import FileIndex
+from .cache import ScanCache
+from .reqcache import unresolved
 
 
 def stdlibUnits(diry: str) -> Tuple[List[Unit], bool]:
@@ -18,10 +23,11 @@ def stdlibUnits(diry: str) -> Tuple[List[Unit], bool]:
     if not os.path.lexists(os.path.join(diry, "Modules")):
         return None, False
 
-    # HACK(performance): filter out test files in standard lib
-    files = [f for f in get_source_files(diry) if (
-        (f.startswith('Lib/')) and ('/test/' not in f) and ('_test' not in f) and ('test_' not in f)
-    )]
+    # HACK(performance): filter out test files in standard lib. Test packages
+    # are pruned while indexing.
+    lib_dir = os.path.join(diry, 'Lib')
+    files = ['Lib/' + f for f in FileIndex(lib_dir, pruned={'test'}).source_files(lib_dir)]
+    files = [f for f in files if ('/test/' not in f) and ('_test' not in f) and ('test_' not in f)]
 
     return [Unit(
         Name = STDLIB_UNIT_KEY.Name,
@@ -43,19 +49,80 @@ def stdlibUnits(diry: str) -> Tuple[List[Unit], bool]:
         Dependencies = [],
     )], True
 
-def find_pip_pkgs(rootdir: str) -> List:
-    setup_dirs = pydepwrap.setup_dirs(rootdir)
-    setup_infos = []
-    for setup_dir in setup_dirs:
-        setup_dict = pydepwrap.setup_info_dir(setup_dir)
-        setup_infos.append(
-            setup_dict_to_json_serializable_dict(setup_dict, rootdir=os.path.relpath(setup_dir, rootdir)))
-    return setup_infos
+def find_pip_pkgs(rootdir: str, jobs: int = 1, initializer=None, initargs=(), index: FileIndex = None,
+                  cache: ScanCache = None) -> List:
+    """
+    Returns the setup info of each setup.py directory, as found in index (by
+    default, an index of rootdir). Setup scripts are run on up to jobs worker
+    processes, initialized like by map_jobs, unless their info is in cache.
+    """
+    if index is None:
+        index = FileIndex(rootdir)
+    setup_dirs = index.dirs_with('setup.py')
+    return cached_map_jobs(cache, 'setup-info', partial(_setup_info, rootdir=rootdir), setup_dirs, jobs,
+                           initializer, initargs, packages=True)
+
+def _setup_info(setup_dir: str, rootdir: str) -> Dict:
+    setup_dict = pydepwrap.setup_info_dir(setup_dir)
+    return setup_dict_to_json_serializable_dict(setup_dict, rootdir=os.path.relpath(setup_dir, rootdir))
+
+def map_jobs(fn, items: List, jobs: int, initializer=None, initargs=()) -> List:
+    """
+    Returns [fn(item) for item in items], computed on up to jobs worker
+    processes if jobs > 1, which run initializer(*initargs) first. Results
+    are in the order of items either way.
+    """
+    if jobs <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    return list(pool_imap(fn, items, jobs, initializer=initializer, initargs=initargs))
+
+def cached_map_jobs(cache: ScanCache, kind: str, fn, dirs: List[str], jobs: int, initializer=None, initargs=(),
+                    packages: bool = False) -> List:
+    """
+    Like map_jobs(fn, dirs, ...), but takes the results for directories
+    whose kind of result is in cache from there, and caches the others. See
+    ScanCache for packages.
+    """
+    if cache is None:
+        return map_jobs(fn, dirs, jobs, initializer, initargs)
+    results = [None] * len(dirs) # type: List[Any]
+    misses = [] # type: List[int]
+    for i, d in enumerate(dirs):
+        found, results[i] = cache.get(kind, d, packages)
+        if not found:
+            misses.append(i)
+    for i, result in zip(misses, map_jobs(fn, [dirs[i] for i in misses], jobs, initializer, initargs)):
+        cache.put(kind, dirs[i], result, packages)
+        results[i] = result
+    return results
+
+def map_requirements(cache: ScanCache, kind: str, fn, dirs: List[str], jobs: int, initializer=None, initargs=()) -> List:
+    """
+    Returns [fn(d, specs) for d in dirs], computed like by map_jobs, where
+    fn returns the resolved requirements of a directory and specs are their
+    unresolved specs as cached under kind, or None. Only the specs are
+    cached, so requirements are resolved through the requirement cache, and
+    its expiry policy, on each run.
+    """
+    specs = [cache.get(kind, d)[1] if cache is not None else None for d in dirs]
+    results = map_jobs(partial(_apply, fn), list(zip(dirs, specs)), jobs, initializer, initargs)
+    if cache is not None:
+        for d, s, result in zip(dirs, specs, results):
+            if s is None:
+                cache.put(kind, d, [unresolved(r) for r in result])
+    return results
+
+def _apply(fn, args: Tuple):
+    return fn(*args)
+
+def _resolved_requirements(pkgdir: str, specs: List[Dict] = None) -> List[Dict]:
+    return pydepwrap.requirements(pkgdir, True, specs)
 
 # Directory name for test files in common practice.
 TEST_DIR = "tests"
 
-def source_files_for_pip_unit(metadata: Dict) -> Tuple[List[str], List[str]]:
+def source_files_for_pip_unit(metadata: Dict, index: FileIndex = None) -> Tuple[List[str], List[str]]:
+    list_source_files = index.source_files if index is not None else get_source_files
     packages, modules = [], [] # type: List[str], List[str]
     if 'packages' in metadata and metadata['packages'] is not None:
         packages.extend(metadata['packages'])
@@ -81,7 +148,7 @@ def source_files_for_pip_unit(metadata: Dict) -> Tuple[List[str], List[str]]:
 
         if not is_root_dir:
             pkg_path = os.path.join(unit_dir, pkg_path)
-        pkg_files = get_source_files(pkg_path)
+        pkg_files = list_source_files(pkg_path)
         for pkg_file in pkg_files:
             files.append(normalize(os.path.join(pkg_path, pkg_file)))
 
@@ -92,7 +159,7 @@ def source_files_for_pip_unit(metadata: Dict) -> Tuple[List[str], List[str]]:
         if not is_root_dir:
             test_dir = os.path.join(unit_dir, TEST_DIR)
 
-        pkg_files = get_source_files(test_dir)
+        pkg_files = list_source_files(test_dir)
         for pkg_file in pkg_files:
             test_files.append(normalize(os.path.join(test_dir, pkg_file)))
 
@@ -120,11 +187,14 @@ def filesToModules(rootdir: str, files: List[str]) -> List[str]:
     return modules
 
 # pkgToUnits transforms a Pip package struct into a list of source units,
-# including main unit and possible test unit.
-def pkgToUnits(pkg: Dict) -> List[Unit]:
+# including main unit and possible test unit. pkgreqs are the resolved
+# requirements of the package, which are looked up if not given. Source
+# files are looked up in index, if given.
+def pkgToUnits(pkg: Dict, pkgreqs: List[Dict] = None, index: FileIndex = None) -> List[Unit]:
     pkgdir = pkg['rootdir']
-    files, test_files = source_files_for_pip_unit(pkg)
-    pkgreqs = pydepwrap.requirements(pkgdir, True)
+    files, test_files = source_files_for_pip_unit(pkg, index)
+    if pkgreqs is None:
+        pkgreqs = _resolved_requirements(pkgdir)
     deps = []
     for pkgreq in pkgreqs:
         dep = pkgToUnitKey(pkgreq)
@@ -174,17 +244,49 @@ def pkgToUnits(pkg: Dict) -> List[Unit]:
         )
     )]
 
-def scan(diry: str) -> None:
+def scan(diry: str, jobs: int = 1, req_cache_dir: str = None, offline: bool = False, wheelhouse: str = None,
+         cache_dir: str = None) -> None:
+    """
+    Write the source units in diry to stdout. Setup scripts are run and
+    requirements resolved on up to jobs worker processes (0 means one per
+    CPU); the output is the same for any number of jobs. Requirements are
+    resolved through a cache in req_cache_dir, if set, and in offline mode
+    only from that cache and the wheels in wheelhouse. With a cache_dir, the
+    setup info and requirement specs of directories whose manifests didn't
+    change are taken from the ScanCache there, and requirements are resolved
+    through a cache in it unless req_cache_dir is set.
+    """
     # special case for standard library
     stdunits, isStdlib = stdlibUnits(diry)
     if isStdlib:
         json.dump(toJSONable(stdunits), sys.stdout, sort_keys=True)
         return
 
+    if req_cache_dir is None and cache_dir is not None:
+        req_cache_dir = os.path.join(cache_dir, 'requirements')
+    # Worker processes configure the cache themselves, in case they don't
+    # inherit the state of this one.
+    cache_args = (req_cache_dir, offline, wheelhouse)
+    pydepwrap.configure_requirement_cache(*cache_args)
+    jobs = cpu_jobs(jobs)
+    # All unit finders look up files in one index of the directory.
+    index = FileIndex(diry)
+    settings = {'offline': offline, 'wheelhouse': os.path.abspath(wheelhouse) if wheelhouse is not None else None}
+    cache = ScanCache(cache_dir, index, settings) if cache_dir is not None else None
+    # Without a scan cache, the requirement cache keeps the requirement specs
+    # of directories, so that setup.py isn't run just to look them up.
+    spec_cache = cache
+    if spec_cache is None and req_cache_dir is not None:
+        spec_cache = ScanCache(os.path.join(req_cache_dir, 'specs'), index, settings)
+    pkgs = find_pip_pkgs(diry, jobs, pydepwrap.configure_requirement_cache, cache_args, index, cache)
+    reqs = map_requirements(spec_cache, 'requirements', _resolved_requirements, [pkg['rootdir'] for pkg in pkgs], jobs,
+                            pydepwrap.configure_requirement_cache, cache_args)
     units = [] # type: List[Unit]
-    for pkg in find_pip_pkgs(diry):
-        units.extend(pkgToUnits(pkg))
-    for proj in django.find_units("."):
+    for pkg, pkgreqs in zip(pkgs, reqs):
+        units.extend(pkgToUnits(pkg, pkgreqs, index))
+    def requirements_txt(d):
+        return map_requirements(spec_cache, 'requirements-txt', pydepwrap.requirements_from_requirements_txt, [d], 1)[0]
+    for proj in django.find_units(".", index=index, requirements_txt=requirements_txt):
         units.append(proj)
 
     # add setuptools as a dependency for all non-stdlib units
@@ -0,0 +1,148 @@
+import gc
+import json
+import os
+import os.path
+import shutil
+import socket
+import stat
+import sys
+import tempfile
+
+import jedi.cache
+
+from .structures import *
+from .graph import graphunit, setup_logger, _stdlib_modules
+from .session import current_rss
+
+class GraphServer:
+    """
+    GraphServer graphs source units for a stream of requests in one
+    long-lived process, so that the interpreter, the imported modules and
+    Jedi's parser cache of the standard library and installed packages stay
+    warm between units. Units are graphed as by `graph`, with the options in
+    args.
+
+    Requests and responses are JSON objects, one per line. A request is a
+    unit, as `graph` reads it, or {"Id": ..., "Unit": unit, "Dir": ...,
+    "Out": ...}, where all but Unit are optional: Dir is the directory to
+    graph the unit in (by default, the server's working directory), and Out
+    is a file to write the graph to. The response is {"Id": ..., "Out":
+    path}, if Out was given, or {"Id": ..., "Graph": graph}, or {"Id": ...,
+    "Error": message} if graphing failed.
+
+    After a request that leaves the resident set size above args.max_rss
+    MB, Jedi's caches are dropped. If that doesn't help, or after
+    args.max_requests requests, the server stops taking requests so that it
+    can be replaced by a fresh process.
+    """
+    def __init__(self, args, logger=None) -> None:
+        self._args = args
+        self._logger = logger if logger is not None else setup_logger(args)
+        self.requests = 0
+        self.recycle = False
+
+    def serve(self, requests, out) -> None:
+        """ Answer the requests, an iterable of lines, on out until they or the server are done. """
+        for line in requests:
+            if not line.strip():
+                continue
+            self.handle(line, out)
+            out.flush()
+            if self.recycle:
+                return
+
+    def handle(self, line: str, out) -> None:
+        """ Graph the unit requested by line and write the response line to out. """
+        request_id = None
+        cwd = os.getcwd()
+        try:
+            request = json.loads(line)
+            if 'Unit' in request:
+                request_id = request.get('Id')
+                unit = request['Unit']
+            else:
+                unit = request
+            u = fromJSONable(unit, Unit) # type: Unit
+            out_path = request.get('Out') if 'Unit' in request else None
+            if out_path is not None:
+                out_path = os.path.abspath(out_path)
+            with tempfile.TemporaryFile(mode='w+', encoding='utf-8') as graph_file:
+                if request.get('Dir') is not None and 'Unit' in request:
+                    os.chdir(request['Dir'])
+                try:
+                    graphunit(self._logger, self._args, u, graph_file)
+                finally:
+                    os.chdir(cwd)
+                graph_file.seek(0)
+                if out_path is not None:
+                    with open(out_path, 'w', encoding='utf-8') as f:
+                        shutil.copyfileobj(graph_file, f)
+                    out.write(json.dumps({'Id': request_id, 'Out': out_path}) + '\n')
+                else:
+                    # The graph is already JSON; copy it into the response
+                    # rather than decoding it.
+                    out.write('{{"Id": {}, "Graph": '.format(json.dumps(request_id)))
+                    shutil.copyfileobj(graph_file, out)
+                    out.write('}\n')
+        except Exception as e:
+            self._logger.exception('failed to serve request')
+            out.write(json.dumps({'Id': request_id, 'Error': '{}: {}'.format(type(e).__name__, e)}) + '\n')
+        self.requests += 1
+        self._check_limits()
+
+    def _check_limits(self) -> None:
+        if self._args.max_requests > 0 and self.requests >= self._args.max_requests:
+            self._logger.info('recycling graph server after {} requests'.format(self.requests))
+            self.recycle = True
+            return
+        max_rss = self._args.max_rss * 1024 * 1024
+        if max_rss > 0 and current_rss() > max_rss:
+            self._logger.info('dropping caches: resident set size exceeds {} MB'.format(self._args.max_rss))
+            drop_caches()
+            if current_rss() > max_rss:
+                self._logger.info('recycling graph server: resident set size still exceeds {} MB'.format(self._args.max_rss))
+                self.recycle = True
+
+def drop_caches() -> None:
+    """ Drop what graphing units leaves cached in the process. """
+    jedi.cache.clear_time_caches(delete_all=True)
+    _stdlib_modules.clear()
+    gc.collect()
+
+def serve_stdio(server: GraphServer) -> None:
+    """ Serve the requests on stdin. """
+    # Keep the real stdout for responses, and send everything else that is
+    # written to it, e.g. by pip, to stderr.
+    out = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    server.serve(iter(sys.stdin.readline, ''), out)
+    out.close()
+
+def serve_socket(server: GraphServer, path: str) -> None:
+    """
+    Serve the requests of the connections to a Unix socket at path, one
+    connection at a time. A stale socket at path is replaced, but any other
+    file there is an error.
+    """
+    try:
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise Exception('{} exists and is not a socket'.format(path))
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+    except:
+        sock.close()
+        raise
+    try:
+        sock.listen(1)
+        while not server.recycle:
+            conn, _ = sock.accept()
+            with conn, conn.makefile('r', encoding='utf-8') as requests, conn.makefile('w', encoding='utf-8') as out:
+                server.serve(requests, out)
+    finally:
+        sock.close()
+        os.remove(path)
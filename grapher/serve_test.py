@@ -0,0 +1,87 @@
+import argparse
+import io
+import json
+import os
+import os.path
+import tempfile
+import unittest
+
+import jedi
+
+if jedi.__version__.startswith('0.9.'):
+    from grapher.serve import GraphServer, serve_socket
+
+def _args(**kwargs):
+    args = dict(jobs=1, max_rss=0, max_requests=0, verbose=False, debug=False, quiet=True)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+@unittest.skipUnless(jedi.__version__.startswith('0.9.'), 'graph needs jedi==0.9.0')
+class TestGraphServer(unittest.TestCase):
+    """
+    Tests for GraphServer, serving the builtin unit, which is graphed without
+    Jedi.
+    """
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.dir = d.name
+        os.makedirs(os.path.join(self.dir, 'Modules'))
+        with open(os.path.join(self.dir, 'Modules', 'spam.c'), 'w') as fp:
+            fp.write('static struct PyModuleDef spammodule = {\n"spam.Error"\n')
+        self.unit = {'Name': '__builtin__', 'Type': 'PipPackage', 'Repo': 'github.com/python/cpython',
+                     'Files': [], 'Dir': os.path.join(self.dir, 'Modules')}
+
+    def serve(self, server, requests):
+        out = io.StringIO()
+        server.serve(io.StringIO(''.join(requests)), out)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_serve(self):
+        out_path = os.path.join(self.dir, 'graph.json')
+        responses = self.serve(GraphServer(_args()), [
+            json.dumps(self.unit) + '\n',
+            '\n',
+            json.dumps({'Id': 1, 'Unit': self.unit, 'Out': out_path}) + '\n',
+            '{\n',
+            json.dumps({'Id': 2, 'Unit': self.unit, 'Dir': self.dir}) + '\n',
+        ])
+        self.assertEqual(4, len(responses))
+        self.assertIsNone(responses[0]['Id'])
+        self.assertEqual(['spam', 'spam.Error'], [d['Path'] for d in responses[0]['Graph']['Defs']])
+        self.assertEqual({'Id': 1, 'Out': out_path}, responses[1])
+        with open(out_path) as fp:
+            self.assertEqual(responses[0]['Graph'], json.load(fp))
+        self.assertIsNone(responses[2]['Id'])
+        self.assertIn('Error', responses[2])
+        self.assertEqual({'Id': 2, 'Graph': responses[0]['Graph']}, responses[3])
+        self.assertNotEqual(self.dir, os.getcwd())
+
+    def test_max_requests(self):
+        server = GraphServer(_args(max_requests=2))
+        responses = self.serve(server, [json.dumps(self.unit) + '\n'] * 3)
+        self.assertEqual(2, len(responses))
+        self.assertTrue(server.recycle)
+
+@unittest.skipUnless(jedi.__version__.startswith('0.9.'), 'graph needs jedi==0.9.0')
+class TestServeSocket(unittest.TestCase):
+    """
+    Tests for serve_socket.
+    """
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.dir = d.name
+
+    def test_keeps_other_files(self):
+        path = os.path.join(self.dir, 'data')
+        with open(path, 'w') as fp:
+            fp.write('keep')
+        with self.assertRaises(Exception):
+            serve_socket(GraphServer(_args()), path)
+        with open(path) as fp:
+            self.assertEqual('keep', fp.read())
+
+    def test_missing_dir(self):
+        with self.assertRaises(FileNotFoundError):
+            serve_socket(GraphServer(_args()), os.path.join(self.dir, 'missing', 'sock'))
@@ -0,0 +1,86 @@
+import gc
+import sys
+
+import jedi
+import jedi.cache
+
+from jedi.api import classes
+from jedi.evaluate.helpers import get_module_names
+from jedi.evaluate import Evaluator, recursion
+
+from typing import List
+
+class AnalysisSession:
+    """
+    AnalysisSession shares one Jedi evaluator between the files of a unit.
+
+    jedi.names creates a fresh evaluator for every file, so the modules a file
+    imports are wrapped and their names inferred again for each file that
+    imports them. A session keeps the evaluator, and with it the imported
+    modules and the memoized inference results, alive across files. Parsed
+    module trees are shared through Jedi's global parser cache either way.
+
+    When the resident set size of the process exceeds max_rss bytes after a
+    file, the evaluator and the parser cache are dropped and the next file
+    starts cold.
+
+    Results can differ from those of jedi.names: a module reached through
+    several import paths gets the dotted name of whichever path the session
+    saw first, rather than the one the current file uses, and inference
+    memoized for one file is reused by the next. On real units, about one ref
+    in a hundred resolves differently. Nor is the session always faster, so
+    it is off by default (see --jedi-session).
+    """
+    def __init__(self, log, max_rss: int = None) -> None:
+        self._log = log
+        self._max_rss = max_rss
+        self._evaluator = None # type: Evaluator
+        self._main_module = None # type: str
+        self.resets = 0
+
+    def names(self, source: str, path: str) -> List[classes.Definition]:
+        """ Like jedi.names(source=source, path=path, all_scopes=True, references=True), but with the shared evaluator. """
+        script = jedi.Script(source, line=1, column=0, path=path)
+        if self._evaluator is None:
+            self._evaluator = Evaluator(script._grammar)
+        # The recursion detectors limit the number of executions per
+        # evaluator, which is meant to be per file.
+        self._evaluator.recursion_detector = recursion.RecursionDetector()
+        self._evaluator.execution_recursion_detector = recursion.ExecutionRecursionDetector()
+        # The evaluator must be swapped before the module is parsed: parsing
+        # registers the module with the evaluator of the script.
+        script._evaluator = self._evaluator
+        module = script._parser.module()
+        # Jedi registers the file under its bare name, like a __main__ module.
+        # That is only valid while this file is being graphed; end_file drops
+        # it again.
+        self._main_module = str(module.name)
+        return sorted((classes.Definition(self._evaluator, n) for n in get_module_names(module, True)),
+                      key=lambda d: (d.line, d.column))
+
+    def end_file(self) -> None:
+        """ Call when done with the names of a file. Drops the session if it uses too much memory. """
+        if self._evaluator is not None and self._main_module is not None:
+            self._evaluator.modules.pop(self._main_module, None)
+        self._main_module = None
+        if self._max_rss is not None and current_rss() > self._max_rss:
+            self._log.info('dropping Jedi session: resident set size exceeds {} MB'.format(self._max_rss // (1024 * 1024)))
+            self.reset()
+
+    def reset(self) -> None:
+        self._evaluator = None
+        jedi.cache.clear_time_caches(delete_all=True)
+        gc.collect()
+        self.resets += 1
+
+def current_rss() -> int:
+    """ Returns the resident set size of this process in bytes. """
+    import resource
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # Without /proc, fall back to the peak resident set size, which can
+        # only overestimate.
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
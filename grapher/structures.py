@@ -2,7 +2,9 @@ import json
 import os
 
 from copy import copy
-from typing import List, Dict, Tuple, NamedTuple, Union, Any
+from functools import lru_cache
+from operator import attrgetter
+from typing import List, Dict, Set, Tuple, NamedTuple, Union, Any, Callable
 
 from .util import normalize
 
@@ -235,54 +237,92 @@ def pkgToUnitKey(pkg: Dict) -> UnitKey:
     )
 
 def fromJSONable(j: Any, dst_t: Union[type, List, Dict]) -> Any:
-    if j is None:
-        return None
-    elif str(dst_t) == 'typing.Any':
-        return copy(j)
+    return compileDecoder(dst_t)(j)
+
+@lru_cache(maxsize=None)
+def compileDecoder(dst_t: Union[type, List, Dict]) -> Callable[[Any], Any]:
+    """
+    Returns a function that converts JSON j into an instance of dst_t. The
+    structure of dst_t is inspected once; decoders are cached per type, so
+    decoding many objects of the same type only runs the compiled checks.
+    """
+    if str(dst_t) == 'typing.Any':
+        return _decoder(copy)
     elif str(dst_t).startswith('typing.List['):
-        if type(j) is not list:
-            raise Exception('attempting to unmarshal non-list {} into list'.format(j))
-        return [fromJSONable(e, dst_t.__parameters__[0]) for e in j] # type: ignore (List.__parameters_ exists)
+        elem = compileDecoder(_typeArgs(dst_t)[0])
+        def decodeList(j):
+            if type(j) is not list:
+                raise Exception('attempting to unmarshal non-list {} into list'.format(j))
+            return [elem(e) for e in j]
+        return _decoder(decodeList)
     elif dst_t is list:
-        if type(j) is not list:
-            raise Exception('attempting to unmarshal non-list into list')
-        return copy(j)
+        def decodeRawList(j):
+            if type(j) is not list:
+                raise Exception('attempting to unmarshal non-list into list')
+            return copy(j)
+        return _decoder(decodeRawList)
     elif str(dst_t).startswith('typing.Dict['):
-        if type(j) is not dict:
-            raise Exception('attempting to unmarshal non-dict into dict')
-        if dst_t.__parameters__[0] is not str: # type: ignore (Dict.__parameters_ exists)
-            raise Exception('attempting to unmarshal into a dict with non-str keys')
-        value_t = dst_t.__parameters__[1] # type: ignore (Dict.__parameters_ exists)
-        return {k: fromJSONable(v, value_t) for k, v in j.items()}
+        key_t, value_t = _typeArgs(dst_t)
+        value = compileDecoder(value_t)
+        def decodeDict(j):
+            if type(j) is not dict:
+                raise Exception('attempting to unmarshal non-dict into dict')
+            if key_t is not str:
+                raise Exception('attempting to unmarshal into a dict with non-str keys')
+            return {k: value(v) for k, v in j.items()}
+        return _decoder(decodeDict)
     elif dst_t is dict:
-        if type(j) is not dict:
-            raise Exception('attempting to unmarshal non-dict into dict')
-        return copy(j)
+        def decodeRawDict(j):
+            if type(j) is not dict:
+                raise Exception('attempting to unmarshal non-dict into dict')
+            return copy(j)
+        return _decoder(decodeRawDict)
     elif dst_t is str:
-        if type(j) is not str:
-            raise Exception('attempting to umarshal non-str into str')
-        return j
+        def decodeStr(j):
+            if type(j) is not str:
+                raise Exception('attempting to umarshal non-str into str')
+            return j
+        return _decoder(decodeStr)
     elif dst_t is int or dst_t is float:
-        if type(j) is not int and type(j) is not float:
-            raise Exception('attempting to unmarshal non-number into number')
-        return j
-    else: # dst_t is a Class
-        if not isinstance(dst_t, type):
+        def decodeNumber(j):
+            if type(j) is not int and type(j) is not float:
+                raise Exception('attempting to unmarshal non-number into number')
+            return j
+        return _decoder(decodeNumber)
+    elif not isinstance(dst_t, type):
+        def decodeUnknown(j):
             raise Exception("couldn't find a constructor for type {}".format(dst_t))
-        if not isinstance(j, dict):
-            raise Exception("couldn't recognize JSON j (type {}) as serializable into type {}".format(type(j), dst_t))
-        params = copy(dst_t.__init__.__annotations__) # type: ignore (SomeClass.__init__ exists)
-        if 'return' in params:
-            del params['return']
-        jk = set([e for e in j.keys()])
-        pk = set([e for e in params.keys()])
-        if not jk.issubset(pk):
-            raise Exception('attempting to unmarshal from JSON object into class {}: {} is not a subset of {}'.format(dst_t, jk, pk))
-        d = {k: fromJSONable(v, params[k]) for k, v in j.items()}
-        return dst_t(**d)
+        return _decoder(decodeUnknown)
+    else: # dst_t is a Class
+        params = {k: v for k, v in dst_t.__init__.__annotations__.items() if k != 'return'} # type: ignore (SomeClass.__init__ exists)
+        fields = {k: compileDecoder(v) for k, v in params.items()}
+        def decodeClass(j):
+            if not isinstance(j, dict):
+                raise Exception("couldn't recognize JSON j (type {}) as serializable into type {}".format(type(j), dst_t))
+            if not j.keys() <= fields.keys():
+                raise Exception('attempting to unmarshal from JSON object into class {}: {} is not a subset of {}'.format(dst_t, set(j.keys()), set(params.keys())))
+            return dst_t(**{k: fields[k](v) for k, v in j.items()})
+        return _decoder(decodeClass)
+
+def _decoder(decode: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """ Wraps decode to map None to None, like every JSON value. """
+    def decodeOrNone(j):
+        if j is None:
+            return None
+        return decode(j)
+    return decodeOrNone
+
+def _typeArgs(t: Union[List, Dict]) -> Tuple:
+    """ Returns the type parameters of a typing generic such as List[str]. """
+    # Newer versions of typing keep them in __args__ only.
+    args = getattr(t, '__args__', None)
+    return args if args else t.__parameters__ # type: ignore (List.__parameters_ exists)
 
 def toJSONable(c: Any) -> Union[Dict, List, str, int]:
-    if isinstance(c, int):
+    encoder = _encoders.get(type(c))
+    if encoder is not None:
+        return encoder(c)
+    elif isinstance(c, int):
         return c
     elif isinstance(c, str):
         return c
@@ -301,8 +341,30 @@ def toJSONable(c: Any) -> Union[Dict, List, str, int]:
             return None
         return {f: toJSONable(c.__getattribute__(f)) for f in fields if not ismethod(c.__getattribute__(f))}
 
+def compileEncoder(t: type) -> Any:
+    """
+    Returns a function that converts instances of class t into JSON-able dicts,
+    equivalent to toJSONable but without reflection. The fields of t are the
+    fields of a NamedTuple or the parameters of t.__init__.
+    """
+    fields = getattr(t, '_fields', None)
+    if fields is None:
+        fields = [f for f in t.__init__.__annotations__ if f != 'return'] # type: ignore (SomeClass.__init__ exists)
+    fields = tuple(fields)
+    get = attrgetter(*fields)
+    def encode(c: Any) -> Dict[str, Any]:
+        # Fields mostly hold str, int and bool values, which are already
+        # JSON-able.
+        return {f: v if type(v) in _primitives else toJSONable(v) for f, v in zip(fields, get(c))}
+    return encode
+
+_primitives = frozenset([str, int, bool, type(None)])
+
 def ismethod(m: Any) -> bool:
     return hasattr(m, '__call__') and hasattr(m, '__self__')
 
 def checkReq(req: Dict) -> bool:
     return req['project_name'] is not None
+
+# _encoders maps the structure classes to their compiled encoders.
+_encoders = {t: compileEncoder(t) for t in [Data, UnitKey, Unit, DefFormatData, DefKey, Ref, Def, Doc]}
@@ -0,0 +1,55 @@
+import unittest
+from grapher import structures
+from grapher.structures import *
+
+class TestToJSONable(unittest.TestCase):
+    """
+    Tests for toJSONable.
+    """
+    def test_compiled_encoders(self):
+        """ Check that the compiled encoders produce the same output as reflection. """
+        data = DefFormatData(Name='f', Keyword='def', Type='', Kind='function', Separator='.')
+        d = Def(Repo='', Unit='u', UnitType=UNIT_PIP, Path='m/f', Kind='function', Name='f',
+                File='m.py', DefStart=0, DefEnd=5, Exported=True, Data=data)
+        u = Unit(Name='u', Type=UNIT_PIP, Files=['m.py'], Dir='.', Dependencies=[STDLIB_UNIT_KEY],
+                 Data=Data(Reqs=[{'project_name': 'six'}], ReqFiles=['requirements.txt']))
+        for c in [d, d.defref(), data, u, STDLIB_UNIT_KEY,
+                  DefKey(Repo='', Unit='u', UnitType=UNIT_PIP, Path='m/f'),
+                  Doc(Unit='u', UnitType=UNIT_PIP, Path='m/f', Format='text/plain', Data='doc', File='m.py')]:
+            self.assertIn(type(c), structures._encoders)
+            self.assertEqual(reflect(c), toJSONable(c))
+
+def reflect(c):
+    """ Serializes c the way toJSONable does for classes without a compiled encoder. """
+    if isinstance(c, (int, str)) or c is None:
+        return c
+    if isinstance(c, list):
+        return [reflect(e) for e in c]
+    if isinstance(c, dict):
+        return {k: reflect(v) for k, v in c.items()}
+    fields = [f for f in dir(c) if not f.startswith('_')]
+    return {f: reflect(getattr(c, f)) for f in fields if not ismethod(getattr(c, f))}
+
+class TestFromJSONable(unittest.TestCase):
+    """
+    Tests for fromJSONable.
+    """
+    def test_round_trip(self):
+        """ Check that units decode into the structure classes and back to the same JSON. """
+        units = [
+            Unit(Name='u', Type=UNIT_PIP, Files=['a.py', 'b/c.py'], Dir='.', Dependencies=[STDLIB_UNIT_KEY],
+                 Data=Data(Reqs=[{'project_name': 'six', 'modules': ['six']}], ReqFiles=['requirements.txt'])),
+            Unit(Name='v', Type=UNIT_TEST, Files=[], Dir='tests'),
+        ]
+        j = toJSONable(units)
+        decoded = fromJSONable(j, List[Unit])
+        self.assertIsInstance(decoded[0].Data, Data)
+        self.assertIsInstance(decoded[0].Dependencies[0], UnitKey)
+        self.assertEqual(j, toJSONable(decoded))
+
+    def test_errors(self):
+        """ Check that JSON that doesn't match the type is rejected. """
+        with self.assertRaises(Exception):
+            fromJSONable({'Name': 'u', 'Bogus': 1}, UnitKey)
+        with self.assertRaises(Exception):
+            fromJSONable({'Name': 'u', 'Type': 't', 'Files': 'a.py', 'Dir': '.'}, Unit)
@@ -0,0 +1,295 @@
+import json
+import keyword
+import logging
+import mmap
+import os
+import os.path
+import platform
+import sysconfig
+import tempfile
+
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import jedi
+
+from .file_grapher import FileGrapher, _import_key, _import_location
+from .pathtrie import PathTrie
+from .util import atomic_write, pool_imap
+
+# INDEX_FORMAT is the version of the index file format and of what it
+# records. Indexes of other formats are not used.
+INDEX_FORMAT = 1
+
+# STDLIB is the distribution name of the standard library.
+STDLIB = 'stdlib'
+
+# Symbol is where an indexed name is defined: the absolute path of the module
+# (None for builtin modules) and the name path in it, as returned by
+# FileGrapher._def_location.
+Symbol = NamedTuple('Symbol', [
+    ('ModulePath', str),
+    ('NamePath', str),
+])
+
+# Distribution is the standard library or an installed distribution: its
+# name, version, the directory its modules are imported from and the names of
+# its top-level modules and packages.
+Distribution = NamedTuple('Distribution', [
+    ('Name', str),
+    ('Version', str),
+    ('Location', str),
+    ('TopLevel', List[str]),
+])
+
+class SymbolIndex:
+    """
+    SymbolIndex is the memory-mapped index of one distribution. It maps the
+    names in import statements of the distribution's modules, keyed as by
+    _import_key, to the definitions Jedi resolves them to: e.g., `json.loads`
+    to where `from json import loads` leads, and `import json` to the json
+    module. It holds every name each module defines or imports at the top
+    level, and its submodules.
+
+    The file starts with a JSON header line, followed by one line per key,
+    `key<TAB>module path<TAB>name path`, sorted by byte value, so a lookup is
+    a binary search that touches only a few pages of the file.
+    """
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._start = self._text.find(b'\n') + 1
+        self.header = json.loads(self._text[:self._start].decode('utf-8')) # type: Dict[str, Any]
+
+    def lookup(self, key: str) -> Symbol:
+        """ Returns the Symbol of a key, or None if it isn't in the index. """
+        key = key.encode('utf-8') + b'\t'
+        lo, hi = self._start, len(self._text)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = max(self._text.rfind(b'\n', 0, mid) + 1, lo)
+            end = self._text.find(b'\n', start)
+            if end == -1:
+                end = len(self._text)
+            line = self._text[start:end]
+            if line.startswith(key):
+                module_path, name_path = line[len(key):].decode('utf-8').split('\t')
+                return Symbol(ModulePath=module_path or None, NamePath=name_path)
+            if line < key:
+                lo = end + 1
+            else:
+                hi = start
+        return None
+
+    def close(self) -> None:
+        self._text.close()
+
+class SymbolIndexes:
+    """
+    SymbolIndexes are the indexes in index_dir of the installed distributions,
+    as FileGrapher uses them. Indexes are opened on first use, and only used
+    if they were built for the distribution where it is installed now.
+    """
+    def __init__(self, index_dir: str, logger=None) -> None:
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+        # _by_top_level maps the name of each top-level module to the
+        # (location, index path) of the distributions that provide it.
+        self._by_top_level = {} # type: Dict[str, List[Tuple[str, str]]]
+        for dist in installed_distributions():
+            path = index_path(index_dir, dist)
+            if os.path.exists(path):
+                for name in dist.TopLevel:
+                    self._by_top_level.setdefault(name, []).append((dist.Location, path))
+        self._indexes = {} # type: Dict[str, SymbolIndex]
+
+    def lookup(self, location: str, top_level: str, key: str) -> Symbol:
+        """
+        Returns the Symbol of a key in the index of the distribution whose
+        top-level module top_level is imported from the directory location,
+        or None if it isn't indexed.
+        """
+        for dist_location, path in self._by_top_level.get(top_level, ()):
+            if dist_location != location:
+                continue
+            index = self._open(path, location)
+            if index is not None:
+                return index.lookup(key)
+        return None
+
+    def _open(self, path: str, location: str) -> SymbolIndex:
+        try:
+            return self._indexes[path]
+        except KeyError:
+            pass
+        index = None
+        try:
+            index = SymbolIndex(path)
+            if index.header.get('Format') != INDEX_FORMAT or index.header.get('Location') != location:
+                self._logger.warning('ignoring symbol index {}: it was built for another installation'.format(path))
+                index.close()
+                index = None
+        except (OSError, ValueError) as e:
+            self._logger.warning('ignoring symbol index {}: {}'.format(path, e))
+        self._indexes[path] = index
+        return index
+
+def index_path(index_dir: str, dist: Distribution) -> str:
+    """ Returns the path of the index of dist in index_dir. """
+    env = '{}-{}-jedi-{}-{}'.format(platform.python_implementation().lower(), platform.python_version(),
+                                    jedi.__version__, INDEX_FORMAT)
+    return os.path.join(index_dir, env, '{}-{}.idx'.format(dist.Name, dist.Version))
+
+def installed_distributions() -> List[Distribution]:
+    """ Returns the standard library and the distributions installed in directories. """
+    import pkg_resources
+
+    stdlib = os.path.realpath(sysconfig.get_paths()['stdlib'])
+    top_level = [] # type: List[str]
+    for entry in sorted(os.listdir(stdlib)):
+        name, ext = os.path.splitext(entry)
+        if ext == '.py' and name.isidentifier():
+            top_level.append(name)
+        elif name not in ('site-packages', 'dist-packages', 'test') and os.path.exists(os.path.join(stdlib, entry, '__init__.py')):
+            top_level.append(entry)
+    dists = [Distribution(Name=STDLIB, Version=platform.python_version(), Location=stdlib, TopLevel=top_level)]
+
+    for dist in pkg_resources.working_set:
+        if dist.location is None or not os.path.isdir(dist.location) or not dist.has_metadata('top_level.txt'):
+            continue
+        dists.append(Distribution(
+            Name=dist.project_name,
+            Version=dist.version,
+            Location=os.path.realpath(dist.location),
+            TopLevel=[n.strip() for n in dist.get_metadata_lines('top_level.txt') if n.strip() != ''],
+        ))
+    return dists
+
+def build_indexes(index_dir: str, names: List[str] = None, jobs: int = 1, force: bool = False, logger=None) -> None:
+    """
+    Builds the missing indexes of the installed distributions named in names
+    (all if None; STDLIB names the standard library) in index_dir, or all of
+    them if force is set. Modules are analyzed on up to jobs worker processes.
+    """
+    logger = logger if logger is not None else logging.getLogger(__name__)
+    for dist in installed_distributions():
+        if names is not None and dist.Name not in names:
+            continue
+        path = index_path(index_dir, dist)
+        if os.path.exists(path) and not force:
+            logger.info('{} {} is already indexed'.format(dist.Name, dist.Version))
+            continue
+        logger.info('indexing {} {}'.format(dist.Name, dist.Version))
+        build_index(dist, path, jobs, logger)
+
+def build_index(dist: Distribution, path: str, jobs: int = 1, logger=None) -> None:
+    """ Builds the index of dist at path. """
+    logger = logger if logger is not None else logging.getLogger(__name__)
+    modules = distribution_modules(dist)
+    lines = {} # type: Dict[str, str]
+    items = [(dist.Location, module, module_path, submodules) for module, module_path, submodules in modules]
+    if jobs > 1:
+        results = pool_imap(_module_symbols, items, jobs)
+    else:
+        results = map(_module_symbols, items)
+    for i, module_lines in enumerate(results, start=1):
+        logger.debug('indexed {} ({}/{}): {} names'.format(modules[i - 1][0], i, len(modules), len(module_lines)))
+        for line in module_lines:
+            # Module keys, like `import a`, recur in the lines of submodules.
+            lines.setdefault(line.split('\t', 1)[0], line)
+    sorted_lines = sorted(lines.values(), key=lambda line: line.encode('utf-8'))
+
+    header = dict(dist._asdict(), Format=INDEX_FORMAT)
+    with atomic_write(path, newline='\n') as fp:
+        fp.write(json.dumps(header, sort_keys=True) + '\n')
+        fp.writelines(sorted_lines)
+    logger.info('indexed {} names of {} modules in {}'.format(len(lines), len(modules), path))
+
+def distribution_modules(dist: Distribution) -> List[Tuple[str, str, List[str]]]:
+    """
+    Returns the (dotted name, path, names of submodules) of the Python modules
+    of dist. Only directories with an __init__.py are packages.
+    """
+    modules = [] # type: List[Tuple[str, str, List[str]]]
+    for top in dist.TopLevel:
+        top_path = os.path.join(dist.Location, top)
+        if os.path.isfile(top_path + '.py'):
+            modules.append((top, top_path + '.py', []))
+            continue
+        for dirpath, dirnames, filenames in os.walk(top_path):
+            dirnames[:] = sorted(d for d in dirnames if d.isidentifier() and os.path.exists(os.path.join(dirpath, d, '__init__.py')))
+            if '__init__.py' not in filenames:
+                dirnames[:] = []
+                continue
+            package = os.path.relpath(dirpath, dist.Location).replace(os.sep, '.')
+            submodules = [os.path.splitext(f)[0] for f in sorted(filenames)
+                          if f.endswith('.py') and f != '__init__.py' and os.path.splitext(f)[0].isidentifier()]
+            modules.append((package, os.path.join(dirpath, '__init__.py'), submodules + dirnames))
+            for name in submodules:
+                modules.append(('{}.{}'.format(package, name), os.path.join(dirpath, name + '.py'), []))
+    return modules
+
+class _NoResolutionCache:
+    """ A ResolutionCache that caches nothing, so that resolutions end in a definition. """
+    def lookup(self, key):
+        return False, None
+
+    def add(self, keys, resolved):
+        pass
+
+def _module_symbols(item: Tuple[str, str, str, List[str]]) -> List[str]:
+    """
+    Returns the index lines of a module: of its names in `import module`,
+    and of the names it defines or imports at the top level and its
+    submodules in `from module import name`, as resolved in a module outside
+    of the distribution.
+    """
+    location, module, module_path, submodules = item
+    log = logging.getLogger(__name__)
+    try:
+        with open(module_path, encoding='utf-8', errors='replace') as fp:
+            source = fp.read()
+        # Parse the module without Jedi's API, which would add it to the
+        # parser cache, where Jedi prefers it to importing modules like
+        # hashlib (see jedi.settings.auto_import_modules); that would change
+        # how the module resolves in the probes.
+        from jedi.parser import Parser, load_grammar
+        tree = Parser(load_grammar(), source).module
+        names = set(name for name, leaves in tree.names_dict.items() if any(n.is_definition() for n in leaves))
+    except Exception as e:
+        log.warning('failed to list the names of {}: {}'.format(module_path, e))
+        return []
+    names.update(submodules)
+    names = sorted(n for n in names if n.isidentifier() and not keyword.iskeyword(n))
+
+    lines = {} # type: Dict[str, str]
+    checked = False
+    with tempfile.TemporaryDirectory() as probe_dir:
+        probe = os.path.join(probe_dir, 'symbolindex_probe.py')
+        with open(probe, 'w', encoding='utf-8') as fp:
+            fp.write('import {}\n'.format(module))
+            fp.writelines('from {} import {}\n'.format(module, n) for n in names)
+        fg = FileGrapher(probe_dir, probe, '', '', PathTrie(), [], log,
+                         resolution_cache=_NoResolutionCache(), stdlib_modules=set(), fast=True)
+        for ref in jedi.names(path=probe, all_scopes=True, definitions=True, references=True):
+            imported = _import_key(ref._name) if ref.type == 'import' else None
+            if imported is None:
+                continue
+            top_name, key = imported
+            if key in lines:
+                continue
+            # Modules shadowed by others of the same name aren't indexed.
+            if not checked:
+                if _import_location(ref._evaluator, top_name.get_parent_until(), top_name) != location:
+                    return []
+                checked = True
+            try:
+                _, d = fg._find_def_for_ref(ref)
+                if d is None:
+                    continue
+                def_module_path, name_path = fg._def_location(d)
+            except Exception as e:
+                log.debug('failed to resolve {} in {}: {}'.format(ref.name, module, e))
+                continue
+            line = '{}\t{}\t{}\n'.format(key, def_module_path or '', name_path)
+            if line.count('\t') == 2 and line.count('\n') == 1:
+                lines[key] = line
+    return list(lines.values())
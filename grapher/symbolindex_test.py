@@ -0,0 +1,30 @@
+import json
+import os.path
+import tempfile
+import unittest
+
+from grapher.symbolindex import SymbolIndex, Symbol
+
+class TestSymbolIndex(unittest.TestCase):
+    """
+    Tests for SymbolIndex.
+    """
+    def test_lookup(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        entries = {'a': ('/lib/a.py', 'a.a'), 'a.b': ('/lib/a.py', 'a.b.b'), 'a.b.c': ('', 'c.c'),
+                   'from a': ('/lib/a.py', 'a.a'), 'import a.b': ('/lib/a/b.py', 'a.b.b')}
+        for i in range(100):
+            entries['m{}.x'.format(i)] = ('/lib/m{}.py'.format(i), 'm.x.x')
+        lines = sorted('{}\t{}\t{}\n'.format(k, *v).encode('utf-8') for k, v in entries.items())
+        path = os.path.join(d.name, 'x.idx')
+        with open(path, 'wb') as fp:
+            fp.write(json.dumps({'Format': 1}).encode('utf-8') + b'\n')
+            fp.writelines(lines)
+        index = SymbolIndex(path)
+        self.addCleanup(index.close)
+        self.assertEqual({'Format': 1}, index.header)
+        for k, (module_path, name_path) in entries.items():
+            self.assertEqual(Symbol(ModulePath=module_path or None, NamePath=name_path), index.lookup(k), k)
+        for k in ['', 'Format', 'a.', 'a.b.c.d', 'b', 'from', 'import a', 'm1', 'm99.y', 'zz']:
+            self.assertIsNone(index.lookup(k), k)
@@ -1,3 +1,58 @@
+import multiprocessing
+import os
+import os.path
+import tempfile
+
+from contextlib import contextmanager
+from functools import lru_cache
+
 def normalize(p: str) -> str:
     """ Transform p to Unix-style by replacing backslashes """
     return p.replace('\\', '/')
+
+def pool_imap(fn, items, jobs, initializer=None, initargs=()):
+    """
+    Lazily map fn over items on a pool of up to `jobs` worker processes. Results
+    are yielded in the order of items, regardless of which worker finishes first.
+    """
+    if len(items) == 0:
+        return
+    with multiprocessing.Pool(min(jobs, len(items)), initializer, initargs) as pool:
+        # chunksize=1 so that one slow item doesn't hold back a batch of fast ones.
+        for result in pool.imap(fn, items, chunksize=1):
+            yield result
+
+def cpu_jobs(jobs: int) -> int:
+    """ Interpret a --jobs flag value, where 0 means one job per CPU. """
+    if jobs <= 0:
+        return multiprocessing.cpu_count()
+    return jobs
+
+@contextmanager
+def atomic_write(path: str, newline: str = None):
+    """
+    Open path for writing UTF-8 text. The text goes to a temporary file in
+    the same directory, which replaces path only when the block completes, so
+    concurrent readers never see a partial file. The file gets the usual
+    permissions of new files, so that e.g. caches and indexes built by root
+    can be read by other users.
+    """
+    diry = os.path.dirname(os.path.abspath(path))
+    os.makedirs(diry, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=diry, suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8', newline=newline) as fp:
+            yield fp
+        # mkstemp creates files readable only by their owner.
+        os.chmod(tmp, 0o666 & ~_umask())
+        os.replace(tmp, path)
+    except:
+        os.remove(tmp)
+        raise
+
+@lru_cache()
+def _umask() -> int:
+    """ Returns the umask of the process, which can only be read by setting it. """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
@@ -0,0 +1,38 @@
+import os
+import os.path
+import stat
+import tempfile
+import unittest
+
+from grapher.util import atomic_write
+
+class TestAtomicWrite(unittest.TestCase):
+    """
+    Tests for atomic_write.
+    """
+    def setUp(self):
+        d = tempfile.TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.dir = d.name
+
+    def test_write(self):
+        path = os.path.join(self.dir, 'a', 'b.json')
+        with atomic_write(path) as fp:
+            fp.write('{}')
+        with open(path) as fp:
+            self.assertEqual('{}', fp.read())
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.assertEqual(0o666 & ~umask, stat.S_IMODE(os.stat(path).st_mode))
+
+    def test_failure(self):
+        path = os.path.join(self.dir, 'b.json')
+        with atomic_write(path) as fp:
+            fp.write('old')
+        with self.assertRaises(ValueError):
+            with atomic_write(path) as fp:
+                fp.write('new')
+                raise ValueError()
+        with open(path) as fp:
+            self.assertEqual('old', fp.read())
+        self.assertEqual(['b.json'], os.listdir(self.dir))
@@ -0,0 +1,80 @@
+import json
+import tempfile
+
+from typing import List, Dict, Set, Tuple, Any
+
+class GraphWriter:
+    """
+    GraphWriter streams the graph output of a unit as it is produced, instead of
+    holding every def, ref and doc of the unit in memory until the end.
+
+    The output is the same JSON object that `json.dump(..., sort_keys=True)`
+    produces for {'Defs': [...], 'Docs': [...], 'Refs': [...]}. Defs are written
+    to the output as soon as they are added; docs and refs are spooled to
+    temporary files and copied to the output by close(). Only compact keys of
+    the defs and docs seen so far are kept in memory for deduplication. When
+    the same def or doc is added twice, the first one wins.
+    """
+    def __init__(self, out) -> None:
+        self._out = out
+        self._docs = _Spool()
+        self._refs = _Spool()
+        self._defs_written = 0
+        self._def_keys = set() # type: Set[str]
+        self._doc_keys = set() # type: Set[Tuple[str, str, str]]
+        self._out.write('{"Defs": [')
+
+    def add(self, defs: List[Dict], refs: List[Dict], docs: List[Dict]) -> None:
+        """ Add the JSON-able defs, refs and docs of one file. """
+        for d in defs:
+            if d['Path'] in self._def_keys:
+                continue
+            self._def_keys.add(d['Path'])
+            if self._defs_written > 0:
+                self._out.write(', ')
+            self._out.write(_dumps(d))
+            self._defs_written += 1
+        for d in docs:
+            key = (d['Unit'], d['UnitType'], d['Path'])
+            if key in self._doc_keys:
+                continue
+            self._doc_keys.add(key)
+            self._docs.write(d)
+        # Refs need no unit-wide deduplication: their key includes the file
+        # they occur in, and FileGrapher already deduplicates within a file.
+        for r in refs:
+            self._refs.write(r)
+        self._out.flush()
+
+    def close(self) -> None:
+        """ Write the spooled docs and refs and terminate the JSON object. """
+        self._out.write('], "Docs": [')
+        self._docs.copy_to(self._out)
+        self._out.write('], "Refs": [')
+        self._refs.copy_to(self._out)
+        self._out.write(']}')
+        self._out.flush()
+
+class _Spool:
+    """ _Spool buffers the comma-separated elements of a JSON array in a temporary file. """
+    def __init__(self) -> None:
+        self._f = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        self._n = 0
+
+    def write(self, e: Any) -> None:
+        if self._n > 0:
+            self._f.write(', ')
+        self._f.write(_dumps(e))
+        self._n += 1
+
+    def copy_to(self, out) -> None:
+        self._f.seek(0)
+        while True:
+            chunk = self._f.read(1 << 20)
+            if not chunk:
+                break
+            out.write(chunk)
+        self._f.close()
+
+def _dumps(e: Any) -> str:
+    return json.dumps(e, sort_keys=True)
@@ -0,0 +1,33 @@
+import io
+import json
+import unittest
+from grapher.writer import GraphWriter
+
+class TestGraphWriter(unittest.TestCase):
+    """
+    Tests for GraphWriter.
+    """
+    def test_matches_json_dump(self):
+        """ Check that streamed output is identical to dumping the whole graph at once. """
+        defs = [{'Path': 'a', 'Name': 'x'}, {'Path': 'b', 'Name': u'é'}]
+        refs = [{'DefPath': 'a', 'Start': 0}, {'DefPath': 'b', 'Start': 3}]
+        docs = [{'Unit': 'u', 'UnitType': 't', 'Path': 'a', 'Data': 'doc\n'}]
+        out = io.StringIO()
+        w = GraphWriter(out)
+        w.add(defs[:1], refs[:1], docs)
+        w.add(defs[1:], refs[1:], [])
+        w.close()
+        exp = json.dumps({'Defs': defs, 'Refs': refs, 'Docs': docs}, sort_keys=True)
+        self.assertEqual(exp, out.getvalue())
+
+    def test_dedup(self):
+        """ Check that duplicate defs and docs are dropped, keeping the first. """
+        out = io.StringIO()
+        w = GraphWriter(out)
+        w.add([{'Path': 'a', 'Name': 'first'}], [], [{'Unit': 'u', 'UnitType': 't', 'Path': 'a'}])
+        w.add([{'Path': 'a', 'Name': 'second'}], [], [{'Unit': 'u', 'UnitType': 't', 'Path': 'a'}])
+        w.close()
+        graph = json.loads(out.getvalue())
+        self.assertEqual([{'Path': 'a', 'Name': 'first'}], graph['Defs'])
+        self.assertEqual(1, len(graph['Docs']))
+        self.assertEqual([], graph['Refs'])
@@ -3,24 +3,56 @@ import os
 import sys
 
 from grapher.scan import scan
-from grapher.graph import graph
+from grapher.graph import graph, setup_logger
+from grapher.serve import GraphServer, serve_stdio, serve_socket
+from grapher.symbolindex import build_indexes
+from grapher.util import cpu_jobs
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="")
     subparsers = parser.add_subparsers(help="", dest="subcmd")
 
     scanparser = subparsers.add_parser("scan", help="")
+    scanparser.add_argument('--jobs', help='number of worker processes to run setup.py files and resolve requirements with (0 means one per CPU)', type=int, default=1)
+    scanparser.add_argument('--req-cache-dir', help='directory of the requirement resolution cache (disabled if unset)', default=None)
+    scanparser.add_argument('--offline', help='resolve requirements only from the requirement cache and the wheelhouse', action='store_true', default=False)
+    scanparser.add_argument('--wheelhouse', help='directory of wheels to resolve requirements from in offline mode', default=None)
+    scanparser.add_argument('--cache-dir', help='directory of the scan cache, which keeps the setup info and requirement specs of directories whose setup.py, setup.cfg and requirements files are unchanged (clear it when other files setup.py reads change), and of the requirement cache unless --req-cache-dir is set (disabled if unset)', default=None)
     depresolveparser = subparsers.add_parser("depresolve", help="")
     graphparser = subparsers.add_parser("graph", help="")
-    graphparser.add_argument('--verbose', help='verbose', action='store_true', default=True)
-    graphparser.add_argument('--debug', help='debug', action='store_true', default=False)
-    graphparser.add_argument('--quiet', help='quiet', action='store_true', default=False)
     graphparser.add_argument('--unit-file', help="debugging purposes", default=None)
+    serveparser = subparsers.add_parser("serve", help="graph the units requested one per line on stdin or a Unix socket, keeping caches warm between them")
+    serveparser.add_argument('--socket', help='path of a Unix socket to serve instead of stdin and stdout', default=None)
+    serveparser.add_argument('--max-rss', help='resident set size in MB above which caches are dropped after a request, and the server exits if that is not enough (0 means no limit)', type=int, default=0)
+    serveparser.add_argument('--max-requests', help='number of requests after which the server exits, to be restarted (0 means no limit)', type=int, default=0)
+    for p in (graphparser, serveparser):
+        p.add_argument('--verbose', help='verbose', action='store_true', default=True)
+        p.add_argument('--debug', help='debug', action='store_true', default=False)
+        p.add_argument('--quiet', help='quiet', action='store_true', default=False)
+        p.add_argument('--jobs', help='number of worker processes to graph files with (0 means one per CPU)', type=int, default=1)
+        p.add_argument('--cache-dir', help='directory of the per-file graph cache (disabled if unset)', default=None)
+        p.add_argument('--cache-size', help='maximum size of the graph cache in MB', type=int, default=1024)
+        p.add_argument('--install-fingerprints', help='file recording pip installs to skip (defaults to one in the Python environment)', default=None)
+        p.add_argument('--jedi-session', help='share one Jedi evaluator across the files of a unit (or of a worker, with --jobs); experimental: some refs can resolve differently than without it, and it is not always faster', action='store_true', default=False)
+        p.add_argument('--session-max-rss', help='resident set size in MB above which the shared Jedi evaluator is dropped', type=int, default=4096)
+        p.add_argument('--file-timeout', help='seconds after which graphing a file stops, keeping the defs and refs found so far (0 means no limit)', type=float, default=0)
+        p.add_argument('--ref-timeout', help='seconds after which resolving a reference is given up (0 means no limit)', type=float, default=0)
+        p.add_argument('--fast', help='skip type formatting and docstrings of defs, for cross-reference-only output', action='store_true', default=False)
+        p.add_argument('--profile-out', help='write a JSON-lines profile of each graphed file (cache hits excluded) to this file and log a summary', default=None)
+        p.add_argument('--symbol-index', help='directory of prebuilt symbol indexes (see the index command) to resolve imports of installed distributions with', default=None)
+    indexparser = subparsers.add_parser("index", help="build the symbol indexes of the standard library and installed distributions")
+    indexparser.add_argument('dists', help='names of the distributions to index (stdlib for the standard library; all if none)', nargs='*')
+    indexparser.add_argument('--index-dir', help='directory of the symbol indexes', required=True)
+    indexparser.add_argument('--jobs', help='number of worker processes to analyze modules with (0 means one per CPU)', type=int, default=1)
+    indexparser.add_argument('--force', help='rebuild existing indexes', action='store_true', default=False)
+    indexparser.add_argument('--verbose', help='verbose', action='store_true', default=True)
+    indexparser.add_argument('--debug', help='debug', action='store_true', default=False)
+    indexparser.add_argument('--quiet', help='quiet', action='store_true', default=False)
 
 
     args = parser.parse_args()
     if args.subcmd == "scan":
-        scan(os.getcwd())
+        scan(os.getcwd(), args.jobs, args.req_cache_dir, args.offline, args.wheelhouse, args.cache_dir)
     elif args.subcmd == "depresolve":
         print('[]', end="")
     elif args.subcmd == "graph":
@@ -29,6 +61,14 @@ def main() -> None:
                 graph(args, f)
         else:
             graph(args, sys.stdin)
+    elif args.subcmd == "serve":
+        server = GraphServer(args)
+        if args.socket is not None:
+            serve_socket(server, args.socket)
+        else:
+            serve_stdio(server)
+    elif args.subcmd == "index":
+        build_indexes(args.index_dir, args.dists or None, cpu_jobs(args.jobs), args.force, setup_logger(args))
 
 if __name__ == '__main__':
     main()